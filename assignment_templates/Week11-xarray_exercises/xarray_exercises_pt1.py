@@ -2,11 +2,9 @@
 # Welcome to the first xarray homework assignment.
 # For this assignment you'll learn some of the basics
 # of using xarray on a real dataset. 
-import os
 import xarray as xr
 import numpy as np
 import matplotlib.pyplot as plt
-from urllib.request import urlretrieve
 
 #%%
 # Step 0. 
@@ -27,14 +25,12 @@ from urllib.request import urlretrieve
 # loop, make sure to "append" the name of the 
 # downloaded file to the `downloaded_files` list.
 
-def download_gridmet_variable(variable, year):
-    base_url = 'https://www.northwestknowledge.net/metdata/data'
-    filename = f'{variable}_{year}.nc'
-    # Only download if the file doesn't exist
-    if not os.path.exists(filename):
-        print(f'Downloading {variable} for {year}...')
-        urlretrieve(f'{base_url}/{filename}', filename)
-    return filename
+# NOTE: `download_gridmet_variable` lives in `hastools.gridmet`.
+# It resumes interrupted downloads and only keeps a file once
+# it is complete, so it is safe to stop and re-run this cell.
+# To grab many variables/years at once in parallel, see
+# `hastools.gridmet.download_gridmet`.
+from hastools.gridmet import download_gridmet_variable
 
 downloaded_files = []
 
@@ -129,6 +125,11 @@ first_ds = None
 # Select the first 30 entries of latitude 
 # and 20th to 40th entries of longitude
 # from the full `ds`
+#
+# NOTE: If you only ever need a small region, see
+# `hastools.gridmet.open_gridmet_subset`, which takes a
+# bounding box or a HUC8 polygon and only reads that
+# part of the files from disk in the first place.
 
 #TODO: Your code here
 subset_ds = None
@@ -229,6 +230,11 @@ correlation
 #
 # Anyhow, this should compute relatively quickly. Where
 # do these variables tend to be decoupled?
+#
+# NOTE: For the full dataset (or many years of it), see
+# `hastools.gridded.coarse_correlation`, which does Steps
+# 13 and 14 in one go and can spread the work over all
+# of your CPU cores with `scheduler='processes'`.
 
 # TODO: Your code here
 
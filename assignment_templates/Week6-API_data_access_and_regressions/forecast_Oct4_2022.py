@@ -1,38 +1,10 @@
 #%%
-import urllib
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.linear_model import LinearRegression
 
-def create_usgs_url(site_no, begin_date, end_date):
-    return (
-        f'https://waterdata.usgs.gov/nwis/dv?'
-        f'cb_00060=on&format=rdb&referred_module=sw&'
-        f'site_no={site_no}&'
-        f'begin_date={begin_date}&'
-        f'end_date={end_date}'
-    )
-
-def open_usgs_data(site, begin_date, end_date):
-    url = create_usgs_url((site), begin_date, end_date)
-    response = urllib.request.urlopen(url)
-    df = pd.read_table(
-        response,
-        comment='#',
-        skipfooter=1,
-        delim_whitespace=True,
-        names=['agency', 'site', 'date', 'streamflow', 'quality_flag'],
-        index_col=2,
-        parse_dates=True
-    ).iloc[2:]
-
-    # Now convert the streamflow data to floats and
-    # the index to datetimes. When processing raw data
-    # it's common to have to do some extra postprocessing
-    df['streamflow'] = df['streamflow'].astype(np.float64)
-    df.index = pd.DatetimeIndex(df.index)
-    return df
+from hastools.usgs import create_usgs_url, open_usgs_data
 
 
 # %%
@@ -150,6 +122,10 @@ one_week_regression = None
 two_week_regression = None
 # ...
 
+# NOTE: Once you're comfortable with this, `hastools.forecast` has
+#       `fit_weekly_regressions`, which fits these same models for
+#       every week of year, lead time, and gauge in one go.
+
 #%%
 # Step 12: Use these regression models to make a prediction!
 # Note: I've pulled out the last week from your data to make the
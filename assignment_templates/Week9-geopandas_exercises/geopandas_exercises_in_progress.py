@@ -1,7 +1,6 @@
 #%%
 # Welcome to the geopandas homework! In this assignment you will 
 
-import urllib
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -116,36 +115,10 @@ verde_gage.plot(ax=ax, color='crimson', marker='*', markersize=100)
 # about downloading streamflow data from USGS!
 # 
 # I've provided you with the functions for downloading
-# data that we've used in the past. You don't have to
-# do anything for this step.
-def create_usgs_url(site_no, begin_date, end_date):
-    return (
-        f'https://waterdata.usgs.gov/nwis/dv?'
-        f'cb_00060=on&format=rdb&referred_module=sw&'
-        f'site_no={site_no}&'
-        f'begin_date={begin_date}&'
-        f'end_date={end_date}'
-    )
-
-def open_usgs_data(site, begin_date, end_date):
-    url = create_usgs_url((site), begin_date, end_date)
-    response = urllib.request.urlopen(url)
-    df = pd.read_table(
-        response,
-        comment='#',
-        skipfooter=1,
-        delim_whitespace=True,
-        names=['agency', 'site', 'date', 'streamflow', 'quality_flag'],
-        index_col=2,
-        parse_dates=True
-    ).iloc[2:]
-
-    # Now convert the streamflow data to floats and
-    # the index to datetimes. When processing raw data
-    # it's common to have to do some extra postprocessing
-    df['streamflow'] = df['streamflow'].astype(np.float64)
-    df.index = pd.DatetimeIndex(df.index)
-    return df
+# data that we've used in the past, which now live in
+# the `hastools.usgs` module. You don't have to do
+# anything for this step.
+from hastools.usgs import create_usgs_url, open_usgs_data
 
 
 #%%
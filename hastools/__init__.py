@@ -0,0 +1,21 @@
+# Shared helpers for the HAS Tools course materials.
+#
+# The starter codes and assignment templates used to copy and
+# paste the same data loading functions into every script. Those
+# now live here so they can be imported instead, e.g.:
+#
+#   from hastools.usgs import open_usgs_data
+#
+# Downloaded data is cached on disk (by default in ~/.cache/hastools,
+# set HASTOOLS_CACHE_DIR to change this), see `hastools.cache`.
+#
+from . import (
+    align, atmosphere, cache, climatology, daymet, download, forecast,
+    geometry, gridded, gridmet, montecarlo, store, usgs
+)
+from .align import align_daymet_usgs
+from .daymet import (
+    open_daymet_data, open_daymet_data_many, open_daymet_dataset
+)
+from .download import fetch_all, fetch_all_async
+from .usgs import create_usgs_url, open_usgs_data, open_usgs_data_many
@@ -0,0 +1,91 @@
+"""
+Joining DayMet weather data with USGS streamflow.
+
+DayMet uses a 365 day calendar which drops December 31st in leap
+years, while USGS reports every calendar day. Reindexing one onto
+the other copies the whole frame and leaves NaN on the missing
+days, so instead we work out matching row positions once and slice.
+When the matching rows are contiguous (the usual case) the result
+shares memory with the inputs rather than copying them.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _take(df, positions):
+    # A contiguous run of rows can be sliced, which doesn't copy
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        return df.iloc[positions[0]:positions[-1] + 1]
+    return df.iloc[positions]
+
+
+def match_calendars(daymet_index, usgs_index, leap_day='drop'):
+    """
+    Match up the days of a DayMet and a USGS date index.
+
+    With `leap_day='drop'` only the days both have are kept, which
+    drops December 31st of leap years. With `leap_day='fill'` every
+    USGS day within the DayMet record is kept, and December 31st
+    of leap years reuses the DayMet values for December 30th.
+
+    Returns (dates, daymet_positions, usgs_positions).
+    """
+    daymet_days = np.asarray(daymet_index, dtype='datetime64[D]')
+    usgs_days = np.asarray(usgs_index, dtype='datetime64[D]')
+    if leap_day == 'drop':
+        dates, daymet_pos, usgs_pos = np.intersect1d(
+            daymet_days, usgs_days, assume_unique=True, return_indices=True)
+    elif leap_day == 'fill' and not len(daymet_days):
+        dates = np.array([], dtype='datetime64[D]')
+        daymet_pos = usgs_pos = np.array([], dtype=np.intp)
+    elif leap_day == 'fill':
+        # Position of the last DayMet day on or before each USGS day
+        daymet_pos = np.searchsorted(daymet_days, usgs_days, side='right') - 1
+        in_range = (daymet_pos >= 0) & (
+            usgs_days <= daymet_days[-1] + np.timedelta64(1, 'D'))
+        usgs_pos = np.flatnonzero(in_range)
+        daymet_pos = daymet_pos[in_range]
+        dates = usgs_days[usgs_pos]
+        # Only December 31st may borrow the previous day's values
+        borrowed = daymet_days[daymet_pos] != dates
+        next_day = dates + np.timedelta64(1, 'D')
+        is_dec31 = (next_day.astype('datetime64[Y]')
+                    != dates.astype('datetime64[Y]'))
+        keep = ~borrowed | is_dec31
+        dates, daymet_pos, usgs_pos = (
+            dates[keep], daymet_pos[keep], usgs_pos[keep])
+    else:
+        raise ValueError(
+            f"leap_day must be 'drop' or 'fill', not {leap_day!r}")
+    return dates, daymet_pos, usgs_pos
+
+
+def align_daymet_usgs(daymet_df, usgs_df, columns=('streamflow',),
+                      leap_day='drop', as_arrow=False):
+    """
+    Join the USGS `columns` onto the DayMet frame by calendar day.
+    This replaces the pattern
+
+        daymet_df = daymet_df.reindex(usgs_df.index)
+        daymet_df['streamflow'] = usgs_df['streamflow']
+
+    without copying the DayMet data or producing NaN rows on the days
+    DayMet skips. See `match_calendars` for the `leap_day` options.
+
+    Returns a DataFrame indexed by date, or a `pyarrow.Table` with a
+    `date` column if `as_arrow=True`.
+    """
+    dates, daymet_pos, usgs_pos = match_calendars(
+        daymet_df.index, usgs_df.index, leap_day)
+    daymet_part = _take(daymet_df, daymet_pos)
+    usgs_part = _take(usgs_df[list(columns)], usgs_pos)
+    # Building from a dict of arrays with copy=False keeps each column
+    # as its own block instead of consolidating (and copying) them
+    data = {c: daymet_part[c].to_numpy() for c in daymet_part.columns}
+    data.update({c: usgs_part[c].to_numpy() for c in columns})
+    df = pd.DataFrame(
+        data, index=pd.DatetimeIndex(dates, name='date'), copy=False)
+    if as_arrow:
+        import pyarrow as pa
+        return pa.Table.from_pandas(df, preserve_index=True)
+    return df
@@ -0,0 +1,100 @@
+"""
+Barometric air pressure.
+
+The course scripts each carried their own copy of
+`air_pressure_at_height`, computing p0 * exp(-(g * h * M) / (R0 * T))
+either in a python loop with `math.exp` or with `np.exp` on whole
+arrays. `air_pressure_at_height` here is the one shared version. It
+works on scalars, numpy arrays, pandas and xarray objects, broadcasts
+heights against temperatures, keeps float32 inputs in float32, and
+for numpy inputs evaluates in place in a single output array.
+
+    air_pressure_at_height(np.arange(0, 20000))
+    ds['pressure'] = air_pressure_at_height(2.0, ds['air'])
+"""
+import math
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+P0 = 101325.0              # reference pressure in pascals
+MOLAR_MASS = 0.02896968    # molar mass of air kg/mol
+GRAVITY = 9.81             # gravity m/s^2
+R0 = 8.314462618           # gas constant J/(mol·K)
+T_REFERENCE = 273.0        # temp in kelvin
+
+# -(g * M) / R0, so that p = p0 * exp(EXPONENT * h / T)
+EXPONENT = -(GRAVITY * MOLAR_MASS) / R0
+
+
+def _pressure(h, T, p0=P0, out=None):
+    """
+    numpy kernel: p0 * exp(EXPONENT * h / T) evaluated in place in
+    `out` (allocated with the broadcast shape of `h` and `T` if not
+    given). Integer inputs give float64, float32 inputs stay float32.
+    """
+    # Lists and tuples, which np.result_type can't take as is
+    if not isinstance(h, (np.ndarray, np.generic, int, float)):
+        h = np.asarray(h)
+    if not isinstance(T, (np.ndarray, np.generic, int, float)):
+        T = np.asarray(T)
+    if out is None:
+        # Scalars (including the 0-d arrays dask passes in) don't
+        # promote, so float32 arrays stay float32
+        dtype = np.result_type(*(
+            x.item() if isinstance(x, np.ndarray) and x.ndim == 0 else x
+            for x in (h, T)
+        ))
+        if not np.issubdtype(dtype, np.inexact):
+            dtype = np.float64
+        shape = np.broadcast_shapes(np.shape(h), np.shape(T))
+        out = np.empty(shape, dtype=dtype)
+    np.multiply(h, EXPONENT, out=out)
+    np.divide(out, T, out=out)
+    np.exp(out, out=out)
+    np.multiply(out, p0, out=out)
+    return out[()] if out.ndim == 0 else out
+
+
+def _wrap_pandas(like, values):
+    if isinstance(like, pd.Series):
+        return pd.Series(values, index=like.index, name=like.name)
+    return pd.DataFrame(values, index=like.index, columns=like.columns)
+
+
+def air_pressure_at_height(h, T=T_REFERENCE, p0=P0, out=None):
+    """
+    Air pressure in pascals at height `h` (meters) for air temperature
+    `T` (kelvin), from the barometric formula with reference pressure
+    `p0`.
+
+    `h` and `T` can be scalars, arrays, pandas or xarray objects and
+    are broadcast against each other (by dimension name for xarray,
+    by label if both are pandas). For numpy inputs the result can be
+    written into an existing array with `out`. Plain python numbers
+    give a python float.
+    """
+    if (out is None and isinstance(h, (int, float))
+            and isinstance(T, (int, float))):
+        # The common case in loops, where numpy's per-call overhead
+        # would dominate
+        return p0 * math.exp(EXPONENT * h / T)
+    if isinstance(h, (xr.DataArray, xr.Dataset)) or isinstance(
+            T, (xr.DataArray, xr.Dataset)):
+        return xr.apply_ufunc(
+            _pressure, h, T, kwargs={'p0': p0},
+            dask='parallelized', keep_attrs=False)
+    h_pandas = isinstance(h, (pd.Series, pd.DataFrame))
+    T_pandas = isinstance(T, (pd.Series, pd.DataFrame))
+    if h_pandas and T_pandas:
+        # Let pandas align the labels first
+        h, T = h.align(T)
+    if h_pandas or T_pandas:
+        like = h if h_pandas else T
+        values = _pressure(
+            h.to_numpy() if h_pandas else h,
+            T.to_numpy() if T_pandas else T,
+            p0, out)
+        return _wrap_pandas(like, values)
+    return _pressure(h, T, p0, out)
@@ -0,0 +1,139 @@
+"""
+A small on-disk cache for the parsed frames returned by the data
+loaders, so re-running a script doesn't re-download data that
+hasn't changed.
+
+Entries are keyed on a hash of the normalized request (e.g. site,
+parameter and date range) and stored as Parquet files. Requests
+whose end date falls in the recent, provisional part of the record
+expire after `ttl` seconds so revised values get picked up; older
+requests never expire. When the cache grows beyond `max_bytes` the
+least recently used entries are removed.
+"""
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+CACHE_DIR = os.environ.get(
+    'HASTOOLS_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'hastools')
+)
+MAX_BYTES = 2 * 1024 ** 3
+TTL = 24 * 60 * 60
+# Data newer than this many days is treated as provisional
+PROVISIONAL_DAYS = 120
+
+_cache = None
+
+
+def cache_key(kind, **params):
+    """
+    Build a content addressed key from the request `kind` and its
+    parameters. Parameter order and value types (e.g. a site as an
+    int or a str) don't change the key.
+    """
+    normalized = {k: str(v) for k, v in params.items() if v is not None}
+    blob = json.dumps([kind, normalized], sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def is_provisional(end_date, provisional_days=PROVISIONAL_DAYS):
+    """True if `end_date` falls in the recent, provisional record."""
+    cutoff = pd.Timestamp.today().normalize() - pd.Timedelta(
+        days=provisional_days)
+    return pd.Timestamp(end_date) >= cutoff
+
+
+class ResponseCache:
+    """A directory of cached frames, see the module docstring."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, ttl=TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return f'{base}.parquet', f'{base}.json'
+
+    def get(self, key):
+        """Return the cached frame for `key`, or None on a miss."""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['expires'] is not None and meta['expires'] < time.time():
+                self.delete(key)
+                return None
+            df = pd.read_parquet(data_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        # Touch the file so eviction knows it was recently used
+        os.utime(data_path)
+        return df
+
+    def put(self, key, df, provisional=False):
+        """
+        Store `df` under `key`. Provisional entries expire after
+        `self.ttl` seconds, everything else is kept until evicted.
+        """
+        data_path, meta_path = self._paths(key)
+        expires = time.time() + self.ttl if provisional else None
+        # Write to temporary files first so a crash can't leave
+        # a half written entry behind
+        df.to_parquet(f'{data_path}.tmp')
+        with open(f'{meta_path}.tmp', 'w') as f:
+            json.dump({'expires': expires}, f)
+        os.replace(f'{data_path}.tmp', data_path)
+        os.replace(f'{meta_path}.tmp', meta_path)
+        self.evict()
+
+    def delete(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.parquet', '.json')):
+                os.remove(entry.path)
+
+    def evict(self):
+        """Drop least recently used entries until under `max_bytes`."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.parquet'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.delete(name[:-len('.parquet')])
+            total -= size
+
+
+def get_cache():
+    """Return the default `ResponseCache`, creating it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+
+def resolve_cache(cache):
+    """
+    Turn the `cache` argument accepted by the loaders into a cache
+    object: None means the default cache, False disables caching.
+    """
+    if cache is None:
+        return get_cache()
+    if cache is False:
+        return None
+    return cache
@@ -0,0 +1,117 @@
+"""
+Day of year / week of year climatologies computed in a single pass.
+
+Running `df.groupby(df.index.dayofyear)` once each for the mean,
+median and a couple of quantiles groups and sorts the whole frame
+every time. `Climatology` works out the group keys once, sorts each
+column by (group, value) once, and reads every statistic straight off
+the sorted values. New years can be added with `update`.
+"""
+import numpy as np
+import pandas as pd
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def group_keys(index, by):
+    """Group number for each date in `index`, for `by` a name or callable."""
+    if callable(by):
+        return np.asarray(by(index), dtype=np.int64)
+    if by == 'dayofyear':
+        return np.asarray(index.dayofyear, dtype=np.int64)
+    if by == 'weekofyear':
+        return np.asarray(index.isocalendar().week, dtype=np.int64)
+    if by == 'month':
+        return np.asarray(index.month, dtype=np.int64)
+    raise ValueError(f'Unknown grouping {by!r}')
+
+
+class Climatology:
+    """
+    Climatological statistics of every column of `df` grouped by `by`
+    (`'dayofyear'`, `'weekofyear'`, `'month'`, or a function of the
+    index). Statistics are `mean`, `min`, `max`, `count`, `median`
+    and each of `quantiles`, and are available as `clim['mean']`, etc.
+    (a DataFrame indexed by group) or all together as `clim.stats`.
+
+        clim = Climatology(df, 'dayofyear', quantiles=(0.25, 0.75))
+        clim['median'].plot()
+    """
+
+    def __init__(self, df, by='dayofyear', quantiles=QUANTILES):
+        self.by = by
+        self.quantiles = tuple(quantiles)
+        self.columns = df.columns
+        self._keys = {}
+        self._values = {}
+        self._stats = None
+        self._add(df)
+
+    def _add(self, df):
+        keys = group_keys(df.index, self.by)
+        for column in self.columns:
+            values = df[column].to_numpy(dtype=np.float64)
+            if column in self._values:
+                keys_c = np.concatenate([self._keys[column], keys])
+                values = np.concatenate([self._values[column], values])
+            else:
+                keys_c = keys
+            # Sort by group, then by value within the group (NaNs last)
+            order = np.lexsort((values, keys_c))
+            self._keys[column] = keys_c[order]
+            self._values[column] = values[order]
+        self._stats = None
+
+    def update(self, df):
+        """Add new data (e.g. the latest year) and refresh the stats."""
+        self._add(df[self.columns])
+        return self
+
+    def _column_stats(self, keys, values):
+        groups, starts, sizes = np.unique(
+            keys, return_index=True, return_counts=True)
+        valid = ~np.isnan(values)
+        count = np.add.reduceat(valid, starts)
+        total = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        has_data = count > 0
+        last = starts + np.maximum(count, 1) - 1
+
+        def quantile(q):
+            # Linear interpolation between the closest ranks, as pandas
+            position = starts + q * (np.maximum(count, 1) - 1)
+            lo = np.floor(position).astype(np.int64)
+            hi = np.ceil(position).astype(np.int64)
+            frac = position - lo
+            result = values[lo] + (values[hi] - values[lo]) * frac
+            return np.where(has_data, result, np.nan)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stats = {
+                'mean': total / count,
+                'min': np.where(has_data, values[starts], np.nan),
+                'max': np.where(has_data, values[last], np.nan),
+                'count': count,
+                'median': quantile(0.5),
+            }
+        for q in self.quantiles:
+            stats[q] = quantile(q)
+        name = self.by if isinstance(self.by, str) else None
+        return pd.DataFrame(stats, index=pd.Index(groups, name=name))
+
+    @property
+    def stats(self):
+        """
+        All statistics as one DataFrame indexed by group, with
+        (statistic, column) columns. Computed once and cached until
+        the next `update`.
+        """
+        if self._stats is None:
+            self._stats = pd.concat(
+                {c: self._column_stats(self._keys[c], self._values[c])
+                 for c in self.columns},
+                axis=1
+            ).swaplevel(axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+        return self._stats
+
+    def __getitem__(self, stat):
+        return self.stats[stat]
@@ -0,0 +1,262 @@
+"""
+Helpers for downloading DayMet daily surface weather data from
+the ORNL single pixel API: https://daymet.ornl.gov/single-pixel/api
+"""
+import io
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from .cache import cache_key, is_provisional, resolve_cache
+from .download import fetch_all_async, run_sync
+from .geometry import LATLON_CRS, as_latlon_geometry
+
+DAYMET_URL = 'https://daymet.ornl.gov/single-pixel/api/data'
+
+# The DayMet 1 km grid is on a Lambert Conformal Conic projection.
+# XMIN and YMAX are the outer edges of the upper left cell.
+DAYMET_CRS = (
+    '+proj=lcc +lat_1=25 +lat_2=60 +lat_0=42.5 +lon_0=-100 '
+    '+x_0=0 +y_0=0 +ellps=WGS84 +units=m +no_defs'
+)
+DAYMET_XMIN = -4560750.0
+DAYMET_YMAX = 4984500.0
+DAYMET_RES = 1000.0
+
+
+def create_daymet_url(lat, lon, begin_date, end_date, variables=None):
+    args = {'lat': lat, 'lon': lon, 'format': 'csv',
+            'start': begin_date, 'end': end_date}
+    if variables is not None:
+        args['vars'] = ','.join(variables)
+    query = urllib.parse.urlencode(args)
+    return f'{DAYMET_URL}?{query}'
+
+
+def daymet_dates(year, yday):
+    """
+    Convert DayMet `year` and `yday` (day of year) columns into
+    `datetime64[D]` dates without going through strings.
+
+    DayMet uses a 365 day calendar: every year has yday 1 to 365.
+    Leap years keep February 29th and drop December 31st instead,
+    so yday 365 is December 30th in a leap year. That means yday is
+    simply the number of days since January 1st, plus one.
+    """
+    year = np.asarray(year, dtype=np.int64)
+    yday = np.asarray(yday, dtype=np.int64)
+    if yday.size and (yday.min() < 1 or yday.max() > 365):
+        raise ValueError('DayMet yday must be between 1 and 365')
+    jan_first = (year - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+    return jan_first + (yday - 1)
+
+
+def daymet_cache_key(lat, lon, begin_date, end_date, variables=None):
+    return cache_key(
+        'daymet', lat=float(lat), lon=float(lon),
+        begin_date=pd.Timestamp(begin_date).date(),
+        end_date=pd.Timestamp(end_date).date(),
+        variables=','.join(sorted(variables)) if variables else None
+    )
+
+
+def read_daymet(text):
+    """
+    Parse a DayMet single pixel csv response into a DataFrame
+    indexed by date.
+    """
+    df = pd.read_csv(io.StringIO(text), header=6)
+    df.index = pd.DatetimeIndex(daymet_dates(df['year'], df['yday']))
+    return df
+
+
+def open_daymet_data(lat, lon, begin_date, end_date, variables=None,
+                     session=None, cache=None):
+    """
+    Download DayMet data for the pixel containing (`lat`, `lon`).
+    By default all variables are returned. Results are stored in the
+    on-disk cache (see `hastools.cache`), pass `cache=False` to
+    always download.
+    """
+    frames = run_sync(_open_points_async(
+        [(lat, lon)], begin_date, end_date, variables, cache,
+        {'session': session}))
+    return frames[0]
+
+
+async def open_daymet_data_async(lat, lon, begin_date, end_date,
+                                 variables=None, cache=None, **kwargs):
+    """`async` version of `open_daymet_data`."""
+    frames = await _open_points_async(
+        [(lat, lon)], begin_date, end_date, variables, cache, kwargs)
+    return frames[0]
+
+
+async def _open_points_async(points, begin_date, end_date, variables,
+                             cache, kwargs):
+    """
+    Return a list of frames, one per point, taking what we can from
+    the cache and downloading the rest concurrently.
+    """
+    cache = resolve_cache(cache)
+    keys = [
+        daymet_cache_key(lat, lon, begin_date, end_date, variables)
+        for lat, lon in points
+    ]
+    frames = [cache.get(key) if cache is not None else None for key in keys]
+    missing = [i for i, df in enumerate(frames) if df is None]
+    urls = [
+        create_daymet_url(*points[i], begin_date, end_date, variables)
+        for i in missing
+    ]
+    texts = await fetch_all_async(urls, **kwargs)
+    provisional = is_provisional(end_date)
+    for i, text in zip(missing, texts):
+        frames[i] = read_daymet(text)
+        if cache is not None:
+            cache.put(keys[i], frames[i], provisional=provisional)
+    return frames
+
+
+async def open_daymet_data_many_async(points, begin_date, end_date,
+                                      variables=None, cache=None, **kwargs):
+    """
+    Download DayMet data for every (lat, lon) pair in `points`
+    concurrently, skipping any that are already in the on-disk cache.
+    Extra keyword arguments go to `fetch_all_async`.
+    Returns a list of DataFrames in the same order as `points`.
+    """
+    return await _open_points_async(
+        list(points), begin_date, end_date, variables, cache, kwargs)
+
+
+def open_daymet_data_many(points, begin_date, end_date, variables=None,
+                          **kwargs):
+    """Blocking version of `open_daymet_data_many_async`."""
+    return run_sync(open_daymet_data_many_async(
+        points, begin_date, end_date, variables, **kwargs))
+
+
+def daymet_cells(lat, lon):
+    """
+    Find the (row, col) index of the DayMet grid cell containing
+    each (`lat`, `lon`) point.
+    """
+    from pyproj import Transformer
+    to_grid = Transformer.from_crs(LATLON_CRS, DAYMET_CRS, always_xy=True)
+    x, y = to_grid.transform(np.asarray(lon), np.asarray(lat))
+    col = np.floor((x - DAYMET_XMIN) / DAYMET_RES).astype(np.int64)
+    row = np.floor((DAYMET_YMAX - y) / DAYMET_RES).astype(np.int64)
+    return row, col
+
+
+def daymet_cell_centers(row, col):
+    """Return the (lat, lon) of the center of each DayMet cell."""
+    from pyproj import Transformer
+    to_latlon = Transformer.from_crs(DAYMET_CRS, LATLON_CRS, always_xy=True)
+    x = DAYMET_XMIN + (np.asarray(col) + 0.5) * DAYMET_RES
+    y = DAYMET_YMAX - (np.asarray(row) + 0.5) * DAYMET_RES
+    lon, lat = to_latlon.transform(x, y)
+    return lat, lon
+
+
+def daymet_cells_in_geometry(geometry):
+    """
+    Find the (row, col) index of every DayMet cell whose center falls
+    inside `geometry`, a shapely polygon in lat/lon coordinates. A
+    geometry too small to contain any cell center (under about 1 km
+    across) gets the one cell containing a point inside it.
+    """
+    import shapely
+    from pyproj import Transformer
+    to_grid = Transformer.from_crs(LATLON_CRS, DAYMET_CRS, always_xy=True)
+    projected = shapely.transform(
+        geometry, to_grid.transform, interleaved=False)
+    if projected.is_empty:
+        raise ValueError('Cannot select DayMet cells with an empty geometry')
+    xmin, ymin, xmax, ymax = projected.bounds
+    cols = np.arange(
+        np.floor((xmin - DAYMET_XMIN) / DAYMET_RES),
+        np.floor((xmax - DAYMET_XMIN) / DAYMET_RES) + 1
+    ).astype(np.int64)
+    rows = np.arange(
+        np.floor((DAYMET_YMAX - ymax) / DAYMET_RES),
+        np.floor((DAYMET_YMAX - ymin) / DAYMET_RES) + 1
+    ).astype(np.int64)
+    row, col = (a.ravel() for a in np.meshgrid(rows, cols, indexing='ij'))
+    x = DAYMET_XMIN + (col + 0.5) * DAYMET_RES
+    y = DAYMET_YMAX - (row + 0.5) * DAYMET_RES
+    inside = shapely.contains_xy(projected, x, y)
+    if not inside.any():
+        point = projected.representative_point()
+        col = np.floor((point.x - DAYMET_XMIN) / DAYMET_RES).astype(np.int64)
+        row = np.floor((DAYMET_YMAX - point.y) / DAYMET_RES).astype(np.int64)
+        return np.array([row]), np.array([col])
+    return row[inside], col[inside]
+
+
+def split_units(column):
+    """Split a DayMet column name like `tmax (deg c)` into name and units."""
+    name, _, units = column.partition(' (')
+    return name, units.rstrip(')')
+
+
+async def open_daymet_dataset_async(target, begin_date, end_date,
+                                    variables=None, **kwargs):
+    """
+    Extract DayMet data for many locations into an xarray Dataset.
+
+    `target` is either a list of (lat, lon) points or a geometry in
+    lat/lon coordinates (a shapely polygon, or a GeoSeries/GeoDataFrame
+    such as a HUC8 boundary from `WBDHU8`, which is reprojected). For a
+    geometry every DayMet cell with its center inside it is extracted.
+
+    Points that fall in the same 1 km DayMet cell are only requested
+    once, and requests go through `open_daymet_data_many_async` so
+    they run concurrently and use the on-disk cache. Extra keyword
+    arguments are passed on to it.
+
+    Returns a Dataset with dimensions (`point`, `time`). For a list of
+    points there is one `point` per input point, in the same order.
+    """
+    target = as_latlon_geometry(target)
+    if hasattr(target, 'geom_type'):
+        row, col = daymet_cells_in_geometry(target)
+        inverse = np.arange(len(row))
+    else:
+        lat, lon = np.asarray(target, dtype=np.float64).reshape(-1, 2).T
+        if not len(lat):
+            raise ValueError('No points given to extract DayMet data for')
+        row, col = daymet_cells(lat, lon)
+        cells, inverse = np.unique(
+            np.stack([row, col], axis=1), axis=0, return_inverse=True)
+        row, col = cells[:, 0], cells[:, 1]
+    lat, lon = daymet_cell_centers(row, col)
+    frames = await open_daymet_data_many_async(
+        list(zip(lat, lon)), begin_date, end_date, variables, **kwargs)
+
+    columns = [c for c in frames[0].columns if c not in ('year', 'yday')]
+    data_vars = {}
+    for column in columns:
+        name, units = split_units(column)
+        values = np.stack([df[column].to_numpy() for df in frames])
+        data_vars[name] = (('point', 'time'), values[inverse], {'units': units})
+    return xr.Dataset(
+        data_vars,
+        coords={
+            'time': frames[0].index.values,
+            'lat': ('point', lat[inverse]),
+            'lon': ('point', lon[inverse]),
+            'row': ('point', row[inverse]),
+            'col': ('point', col[inverse]),
+        }
+    )
+
+
+def open_daymet_dataset(target, begin_date, end_date, variables=None,
+                        **kwargs):
+    """Blocking version of `open_daymet_dataset_async`."""
+    return run_sync(open_daymet_dataset_async(
+        target, begin_date, end_date, variables, **kwargs))
@@ -0,0 +1,174 @@
+"""
+Shared HTTP plumbing for the data loaders.
+
+Everything goes through one pooled, keep-alive `requests.Session`.
+On top of that there is a small asyncio engine for fetching many
+urls at once, with a bounded number of requests in flight, a per
+host rate limit, retries with exponential backoff, and an optional
+progress callback. Both a blocking (`fetch_all`) and an `async`
+(`fetch_all_async`) entry point are provided.
+"""
+import asyncio
+import concurrent.futures
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Smallest connection pool of the shared session, it grows to the
+# largest `max_concurrency` used with it
+POOL_SIZE = 16
+TIMEOUT = 60
+
+# Defaults for the concurrent engine
+MAX_CONCURRENCY = 8
+RETRIES = 3
+BACKOFF = 1.0
+
+# Status codes that are worth trying again
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_session = None
+_pool_size = 0
+
+
+def get_session(pool_size=POOL_SIZE):
+    """
+    Return the module wide `requests.Session`, creating it on first
+    use. The session keeps connections alive between requests, up to
+    `pool_size` per host; asking for a bigger pool than the session
+    has replaces its adapters with bigger ones. Retries are left to
+    `fetch_all_async`, so the adapter doesn't retry on its own.
+    """
+    global _session, _pool_size
+    if _session is None:
+        _session = requests.Session()
+        _session.headers['Connection'] = 'keep-alive'
+    if pool_size > _pool_size:
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size
+        )
+        _session.mount('https://', adapter)
+        _session.mount('http://', adapter)
+        _pool_size = pool_size
+    return _session
+
+
+def fetch_text(url, session=None):
+    """Download `url` with the shared session and return the body."""
+    session = session or get_session()
+    response = session.get(url, timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.text
+
+
+class RetryableError(Exception):
+    """Raised for responses that should be retried after a pause."""
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests so that no single host receives more than
+    `rate` requests per second. A `rate` of None means no limit.
+    """
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self._next_time = {}
+        self._locks = {}
+
+    async def wait(self, url):
+        if not self.rate:
+            return
+        host = urlsplit(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            start = max(now, self._next_time.get(host, now))
+            self._next_time[host] = start + 1.0 / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def _get(session, url, missing_ok=False):
+    response = session.get(url, timeout=TIMEOUT)
+    if missing_ok and response.status_code == 404:
+        return None
+    if response.status_code in RETRY_STATUS:
+        raise RetryableError(f'{response.status_code} from {url}')
+    response.raise_for_status()
+    return response.text
+
+
+async def fetch_all_async(urls, max_concurrency=MAX_CONCURRENCY, rate=None,
+                          retries=RETRIES, backoff=BACKOFF, progress=None,
+                          session=None, missing_ok=False):
+    """
+    Download every url in `urls` concurrently and return the bodies
+    in the same order.
+
+    At most `max_concurrency` requests are in flight at once, and each
+    host is limited to `rate` requests per second. Failed requests
+    (connection errors, 429 and 5xx responses) are retried up to
+    `retries` times, waiting `backoff * 2**attempt` seconds between
+    tries. If given, `progress(n_done, n_total, url)` is called as each
+    download finishes. With `missing_ok=True` urls answered with 404
+    give None instead of raising.
+
+    The blocking requests run in a thread pool of `max_concurrency`
+    threads owned by this call, rather than the event loop's default
+    executor, whose size would otherwise cap the concurrency. The
+    shared session's connection pool is grown to match. A `session`
+    passed in should have a pool of at least `max_concurrency`
+    connections per host, or urllib3 drops the extra connections
+    instead of reusing them.
+    """
+    urls = list(urls)
+    session = session or get_session(max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limiter = HostRateLimiter(rate)
+    loop = asyncio.get_running_loop()
+    n_done = 0
+
+    async def fetch_one(url):
+        nonlocal n_done
+        async with semaphore:
+            for attempt in range(retries + 1):
+                await limiter.wait(url)
+                try:
+                    text = await loop.run_in_executor(
+                        pool, _get, session, url, missing_ok)
+                    break
+                except (RetryableError, requests.ConnectionError,
+                        requests.Timeout):
+                    if attempt == retries:
+                        raise
+                    await asyncio.sleep(backoff * 2 ** attempt)
+        n_done += 1
+        if progress is not None:
+            progress(n_done, len(urls), url)
+        return text
+
+    with concurrent.futures.ThreadPoolExecutor(max_concurrency) as pool:
+        return await asyncio.gather(*(fetch_one(url) for url in urls))
+
+
+def run_sync(coroutine):
+    """
+    Run `coroutine` to completion from blocking code. This also works
+    inside Jupyter/VS Code interactive windows, where an event loop is
+    already running, by using a fresh loop in a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with concurrent.futures.ThreadPoolExecutor(1) as pool:
+        return pool.submit(asyncio.run, coroutine).result()
+
+
+def fetch_all(urls, **kwargs):
+    """Blocking version of `fetch_all_async`, see there for details."""
+    return run_sync(fetch_all_async(urls, **kwargs))
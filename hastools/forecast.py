@@ -0,0 +1,403 @@
+"""
+Vectorized weekly streamflow forecasting.
+
+The Week6 forecast template fits one `LinearRegression` mapping this
+week's mean flow to the flow one (or two) weeks later, using only the
+weeks of the record with the same week of year. Doing that for every
+week of year, lead time and gauge means thousands of tiny sklearn
+fits. Here all of them are solved at once from the closed form
+normal equations of a simple linear regression (y = slope*x +
+intercept), with the sums for every group computed in one pass.
+"""
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+N_WEEKS_OF_YEAR = 53
+# Fewest past pairs a backtest model needs before it is used
+MIN_YEARS = 5
+
+
+def week_of_year(index):
+    """ISO week of year (1-53) for each date in a DatetimeIndex."""
+    return np.asarray(index.isocalendar().week, dtype=np.int64)
+
+
+def _as_frame(weekly):
+    if isinstance(weekly, pd.Series):
+        return weekly.to_frame(weekly.name or 'streamflow')
+    return weekly
+
+
+def lag_lead_windows(values, lags=1, leads=1):
+    """
+    Build lag/lead design matrices for a 1d series as read-only views,
+    without copying the data.
+
+    Row i of `x` holds the `lags` values up to and including time
+    t = i + lags - 1 (oldest first), and row i of `y` holds the `leads`
+    values after it. Returns (x, y) with shapes (n_rows, lags) and
+    (n_rows, leads), where n_rows is zero for a series shorter than
+    `lags + leads`.
+    """
+    if lags < 1 or leads < 1:
+        raise ValueError('lags and leads must both be at least 1')
+    values = np.asarray(values)
+    if len(values) < lags + leads:
+        return (np.empty((0, lags), values.dtype),
+                np.empty((0, leads), values.dtype))
+    windows = sliding_window_view(values, lags + leads)
+    return windows[:, :lags], windows[:, lags:]
+
+
+def lag_lead_matrix(series, lags=1, leads=1, weekofyear=None, dropna=True):
+    """
+    Lag/lead design matrices for a pandas Series with a DatetimeIndex,
+    e.g. weekly streamflow, as in Step 3 of the forecast template.
+
+    Rows can be restricted to times `t` in a given `weekofyear` (an int
+    or a list of them), and with `dropna=True` rows with a NaN anywhere
+    in their window are skipped. Both are done by picking row numbers
+    up front, so only the selected rows are ever copied and, with no
+    filtering needed, `x` and `y` stay views of the series data.
+
+    Returns (x, y, dates) where `dates` holds the time `t` of each row.
+    """
+    width = lags + leads
+    x, y = lag_lead_windows(series.to_numpy(dtype=np.float64), lags, leads)
+    dates = series.index[lags - 1:lags - 1 + len(x)]
+    keep = np.ones(len(x), dtype=bool)
+    if dropna:
+        # Running count of NaNs, so each window's count is a difference
+        n_nan = np.concatenate(
+            [[0], np.cumsum(np.isnan(series.to_numpy(dtype=np.float64)))])
+        keep &= (n_nan[width:] - n_nan[:-width]) == 0
+    if weekofyear is not None:
+        keep &= np.isin(week_of_year(dates), np.atleast_1d(weekofyear))
+    if keep.all():
+        return x, y, dates
+    rows = np.flatnonzero(keep)
+    return x[rows], y[rows], dates[rows]
+
+
+def batched_normal_equations(x, y, groups, n_groups):
+    """
+    Solve y = slope*x + intercept separately for every group and every
+    column, from the sums of the normal equations.
+
+    `x` and `y` are (time, ...) arrays and `groups` gives the group
+    number of each time step. Pairs where either value is NaN are
+    skipped. Returns (slope, intercept, r2, n) arrays of shape
+    (n_groups, ...).
+    """
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    # One-hot (group, time) matrix, so each group's sums are one matmul
+    one_hot = np.zeros((n_groups, len(groups)))
+    one_hot[groups, np.arange(len(groups))] = 1.0
+
+    def group_sum(a):
+        return np.tensordot(one_hot, a, axes=1)
+
+    n = group_sum(valid.astype(np.float64))
+    sx = group_sum(x)
+    sy = group_sum(y)
+    sxx = group_sum(x * x)
+    syy = group_sum(y * y)
+    sxy = group_sum(x * y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = n * sxy - sx * sy
+        var_x = n * sxx - sx * sx
+        var_y = n * syy - sy * sy
+        slope = cov / var_x
+        intercept = (sy - slope * sx) / n
+        r2 = cov * cov / (var_x * var_y)
+    return slope, intercept, r2, n.astype(np.int64)
+
+
+def fit_weekly_regressions(weekly, leads=(1, 2)):
+    """
+    Fit the Week6 template's regression for every week of year, every
+    lead time in `leads` (in weeks), and every site at once.
+
+    `weekly` holds weekly mean streamflow indexed by date, either as a
+    Series for one site or a DataFrame with one column per site. Each
+    regression maps the flow in a given week of year to the flow
+    `lead` weeks later.
+
+    Returns a coefficient table indexed by (`site`, `weekofyear`,
+    `lead`) with the columns `slope`, `intercept`, `r2`, and `n`.
+    """
+    weekly = _as_frame(weekly)
+    values = weekly.to_numpy(dtype=np.float64)
+    woy = week_of_year(weekly.index)
+    tables = []
+    for lead in leads:
+        slope, intercept, r2, n = batched_normal_equations(
+            values[:-lead], values[lead:], woy[:-lead] - 1, N_WEEKS_OF_YEAR)
+        tables.append(np.stack([slope, intercept, r2, n], axis=-1))
+    # (lead, week, site, stat) -> rows ordered by site, week, lead
+    coefs = np.stack(tables).transpose(2, 1, 0, 3).reshape(-1, 4)
+    index = pd.MultiIndex.from_product(
+        [weekly.columns, np.arange(1, N_WEEKS_OF_YEAR + 1), list(leads)],
+        names=['site', 'weekofyear', 'lead']
+    )
+    table = pd.DataFrame(
+        coefs, index=index, columns=['slope', 'intercept', 'r2', 'n'])
+    table['n'] = table['n'].astype(np.int64)
+    return table
+
+
+def forecast_from_table(table, weekly):
+    """
+    Make forecasts from the last week of `weekly` using a coefficient
+    table from `fit_weekly_regressions`. Returns a DataFrame indexed by
+    site with one column per lead time.
+    """
+    weekly = _as_frame(weekly)
+    last = weekly.iloc[-1]
+    woy = week_of_year(weekly.index[-1:])[0]
+    coefs = table.xs(woy, level='weekofyear')
+    slope = coefs['slope'].unstack('lead')
+    intercept = coefs['intercept'].unstack('lead')
+    return slope.mul(last, axis=0) + intercept
+
+
+def _backtest_block(values, woy, leads, min_years):
+    """
+    Backtest one block of sites, see `backtest_weekly`. Returns an
+    array of shape (lead, week, site, 4) holding the forecast count
+    and the sums of absolute error, squared error, and squared error
+    of the climatology forecast.
+    """
+    n_time, n_sites = values.shape
+    group = woy - 1
+    out = np.zeros((len(leads), N_WEEKS_OF_YEAR, n_sites, 4))
+    for i, lead in enumerate(leads):
+        # Normal equation sums for y = slope*x + intercept per
+        # (week of year, site), updated one observation at a time
+        n = np.zeros((N_WEEKS_OF_YEAR, n_sites))
+        sx = np.zeros_like(n)
+        sy = np.zeros_like(n)
+        sxx = np.zeros_like(n)
+        sxy = np.zeros_like(n)
+        for t in range(n_time):
+            # The pair (t - lead -> t) has just been observed
+            if t >= lead:
+                x, y = values[t - lead], values[t]
+                ok = ~(np.isnan(x) | np.isnan(y))
+                g = group[t - lead]
+                n[g] += ok
+                sx[g] += np.where(ok, x, 0.0)
+                sy[g] += np.where(ok, y, 0.0)
+                sxx[g] += np.where(ok, x * x, 0.0)
+                sxy[g] += np.where(ok, x * y, 0.0)
+            if t + lead >= n_time:
+                continue
+            # Forecast t + lead from t with what is known at time t
+            g = group[t]
+            x, target = values[t], values[t + lead]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                slope = (n[g] * sxy[g] - sx[g] * sy[g]) / (
+                    n[g] * sxx[g] - sx[g] * sx[g])
+                climatology = sy[g] / n[g]
+                predicted = climatology + slope * (x - sx[g] / n[g])
+            ok = (n[g] >= min_years) & ~np.isnan(predicted) & ~np.isnan(target)
+            error = np.where(ok, predicted - target, 0.0)
+            clim_error = np.where(ok, climatology - target, 0.0)
+            out[i, g, :, 0] += ok
+            out[i, g, :, 1] += np.abs(error)
+            out[i, g, :, 2] += error * error
+            out[i, g, :, 3] += clim_error * clim_error
+    return out
+
+
+def backtest_weekly(weekly, leads=(1, 2), min_years=MIN_YEARS, n_jobs=1):
+    """
+    Rolling origin backtest of the weekly regressions from
+    `fit_weekly_regressions`.
+
+    Every week in the record is replayed as a forecast date. Each
+    forecast uses only a model fit on the pairs observed up to that
+    date, which is kept current with a rank-one update of the normal
+    equation sums as each week arrives rather than refitting. A model
+    needs at least `min_years` pairs before it is used. Forecasts are
+    compared against climatology, the mean target flow of the same
+    pairs. Sites are split over `n_jobs` processes.
+
+    Returns a table indexed by (`site`, `weekofyear`, `lead`) with the
+    columns `n_forecasts`, `mae`, `rmse`, `clim_rmse` and `skill`
+    (1 - MSE / MSE of climatology).
+    """
+    weekly = _as_frame(weekly)
+    values = weekly.to_numpy(dtype=np.float64)
+    woy = week_of_year(weekly.index)
+    leads = list(leads)
+    if n_jobs == 1:
+        sums = _backtest_block(values, woy, leads, min_years)
+    else:
+        blocks = np.array_split(values, n_jobs, axis=1)
+        with concurrent.futures.ProcessPoolExecutor(n_jobs) as pool:
+            parts = pool.map(
+                _backtest_block, blocks, [woy] * n_jobs,
+                [leads] * n_jobs, [min_years] * n_jobs)
+            sums = np.concatenate(list(parts), axis=2)
+
+    # (lead, week, site, stat) -> rows ordered by site, week, lead
+    sums = sums.transpose(2, 1, 0, 3).reshape(-1, 4)
+    count = sums[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mse = sums[:, 2] / count
+        clim_mse = sums[:, 3] / count
+        table = pd.DataFrame({
+            'n_forecasts': count.astype(np.int64),
+            'mae': sums[:, 1] / count,
+            'rmse': np.sqrt(mse),
+            'clim_rmse': np.sqrt(clim_mse),
+            'skill': 1 - mse / clim_mse,
+        })
+    table.index = pd.MultiIndex.from_product(
+        [weekly.columns, np.arange(1, N_WEEKS_OF_YEAR + 1), leads],
+        names=['site', 'weekofyear', 'lead']
+    )
+    return table
+
+
+class OnlineWeeklyRegression:
+    """
+    Online versions of the weekly regressions, one per (site, week of
+    year), that can be updated a week at a time.
+
+    Each model keeps the sufficient statistics of its least squares
+    fit, the running sums X'X and X'y (intercept first), so adding an
+    observation costs O(p^2) for p coefficients instead of a refit on
+    the full record, and the coefficients are exactly the ordinary
+    least squares ones whatever the scale of the flows. With a
+    `forgetting` factor below 1, older observations are down weighted
+    so the models can track slow changes. The state can be written to
+    disk with `save` and read back with `load`.
+    """
+
+    def __init__(self, sites, n_features=1, forgetting=1.0):
+        # Kept as given, so int site labels still select their columns
+        self.sites = pd.Index(sites)
+        self.forgetting = forgetting
+        p = n_features + 1
+        shape = (len(self.sites), N_WEEKS_OF_YEAR)
+        self.xtx = np.zeros(shape + (p, p))
+        self.xty = np.zeros(shape + (p,))
+        self.n = np.zeros(shape, dtype=np.int64)
+
+    @staticmethod
+    def _features(x):
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim == 1:
+            x = x[:, None]
+        return np.concatenate([np.ones((len(x), 1)), x], axis=1)
+
+    def update(self, weekofyear, x, y):
+        """
+        Add one observation per site to that site's model for
+        `weekofyear`. `x` has shape (sites,) or (sites, n_features)
+        and `y` shape (sites,). Sites with a NaN are left unchanged.
+        """
+        phi = self._features(x)
+        y = np.asarray(y, dtype=np.float64)
+        ok = ~(np.isnan(phi).any(axis=1) | np.isnan(y))
+        sites = np.flatnonzero(ok)
+        g = weekofyear - 1
+        phi, y = phi[ok], y[ok]
+        self.xtx[sites, g] = (
+            self.forgetting * self.xtx[sites, g]
+            + np.einsum('si,sj->sij', phi, phi))
+        self.xty[sites, g] = (
+            self.forgetting * self.xty[sites, g] + phi * y[:, None])
+        self.n[sites, g] += 1
+        return self
+
+    def coefficients(self, weekofyear=None):
+        """
+        Least squares coefficients (intercept first) of every site's
+        model for `weekofyear`, or of all models if not given. Models
+        with fewer observations than coefficients, or whose inputs
+        never varied, are NaN.
+        """
+        if weekofyear is None:
+            xtx, xty, n = self.xtx, self.xty, self.n
+        else:
+            g = weekofyear - 1
+            xtx, xty, n = self.xtx[:, g], self.xty[:, g], self.n[:, g]
+        p = xty.shape[-1]
+        theta = np.full(xty.shape, np.nan)
+        solvable = (n >= p) & (np.linalg.matrix_rank(xtx) == p)
+        theta[solvable] = np.linalg.solve(
+            xtx[solvable], xty[solvable][..., None])[..., 0]
+        return theta
+
+    @property
+    def theta(self):
+        return self.coefficients()
+
+    def predict(self, weekofyear, x):
+        """
+        Predict for every site from `x` using the `weekofyear` models.
+        Sites whose model can't be fit yet get NaN.
+        """
+        phi = self._features(x)
+        return np.einsum('si,si->s', phi, self.coefficients(weekofyear))
+
+    @classmethod
+    def from_weekly(cls, weekly, lead=1, **kwargs):
+        """
+        Build models mapping each week's flow to the flow `lead` weeks
+        later by replaying the whole `weekly` record (a Series, or a
+        DataFrame with one column per site). Keyword arguments are
+        passed on to the constructor.
+        """
+        weekly = _as_frame(weekly)
+        model = cls(weekly.columns, **kwargs)
+        model.observe(weekly, lead)
+        return model
+
+    def observe(self, weekly, lead=1):
+        """
+        Update the models with every (week -> week + `lead`) pair in
+        `weekly`. To add just the newest week, pass the last
+        `lead + 1` rows.
+        """
+        weekly = _as_frame(weekly)[self.sites]
+        values = weekly.to_numpy(dtype=np.float64)
+        woy = week_of_year(weekly.index)
+        for t in range(len(values) - lead):
+            self.update(woy[t], values[t], values[t + lead])
+        return self
+
+    @staticmethod
+    def _npz_path(path):
+        # np.savez adds the suffix if it's missing, so do the same here
+        path = os.fspath(path)
+        return path if path.endswith('.npz') else f'{path}.npz'
+
+    def save(self, path):
+        """Write the model state to `path` (`.npz` is added if missing)."""
+        np.savez(
+            self._npz_path(path), sites=np.array(self.sites.tolist()),
+            xtx=self.xtx,
+            xty=self.xty, n=self.n, forgetting=self.forgetting
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Read a model written by `save`."""
+        with np.load(cls._npz_path(path)) as f:
+            model = cls.__new__(cls)
+            model.sites = pd.Index(f['sites'].tolist())
+            model.xtx = f['xtx']
+            model.xty = f['xty']
+            model.n = f['n']
+            model.forgetting = float(f['forgetting'])
+        return model
@@ -0,0 +1,29 @@
+"""
+Small helpers for the geometries (e.g. HUC8 boundaries) used to
+select data from the gridded loaders.
+"""
+import numpy as np
+
+LATLON_CRS = 'EPSG:4326'
+
+
+def as_latlon_geometry(target):
+    """
+    Turn a GeoSeries/GeoDataFrame into a single shapely geometry in
+    lat/lon coordinates. Shapely geometries are returned unchanged
+    and are assumed to already be in lat/lon.
+    """
+    if hasattr(target, 'to_crs'):
+        target = target.to_crs(LATLON_CRS)
+        target = target.geometry.union_all()
+    return target
+
+
+def contains_latlon(geometry, lat, lon):
+    """
+    A 2d (lat, lon) boolean mask of which grid points fall inside
+    `geometry`, for 1d `lat` and `lon` coordinate arrays.
+    """
+    import shapely
+    lon2d, lat2d = np.meshgrid(np.asarray(lon), np.asarray(lat))
+    return shapely.contains_xy(geometry, lon2d, lat2d)
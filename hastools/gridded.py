@@ -0,0 +1,186 @@
+"""
+Parallel, lazy processing of gridded data such as GridMET.
+
+The Week11 exercises coarsen the full dataset and then correlate two
+variables over time with `xr.corr`. Left to its defaults, that runs
+on whatever chunks `open_mfdataset` picked (one per file) and
+`xr.corr` builds demeaned copies of both inputs. Here instead:
+
+  - `chunk_for_coarsen` picks chunks that line up with the coarsen
+    windows, so each window is reduced within a single chunk
+  - `corr_by_sums` computes the correlation from running sums
+    (n, sum x, sum y, sum x^2, sum y^2, sum xy), which dask evaluates
+    as simple per-chunk reductions in one pass over the data
+  - `coarse_correlation` ties it together and lets you choose the
+    dask scheduler, e.g. `scheduler='processes'` to use every core
+
+`StreamingRegression` and `streaming_regression` apply the same
+running sums idea without dask, reading a block of time steps at a
+time to produce correlation, slope, intercept and r^2 maps.
+
+For example, Steps 13-15 become:
+
+    correlation = coarse_correlation(
+        ds, 'potential_evapotranspiration',
+        'mean_vapor_pressure_deficit', {'lat': 4, 'lon': 4},
+        scheduler='processes'
+    )
+    correlation.plot()
+"""
+import numpy as np
+import xarray as xr
+
+# Rough size to aim for per chunk, in bytes
+TARGET_CHUNK_BYTES = 64 * 1024 ** 2
+
+
+def chunk_for_coarsen(ds, factors, dim='day',
+                      target_bytes=TARGET_CHUNK_BYTES):
+    """
+    Rechunk `ds` so that spatial chunks are whole multiples of the
+    coarsen `factors` (a dict of dim -> window size), keeping the
+    full extent of `dim` in each chunk when it fits in about
+    `target_bytes`. Otherwise time is split as well.
+    """
+    itemsize = max(
+        (v.dtype.itemsize for v in ds.data_vars.values()), default=8)
+    n_time = ds.sizes[dim]
+    # How many coarse cells fit in a chunk with the whole time axis
+    window = int(np.prod(list(factors.values())))
+    n_windows = max(1, target_bytes // (itemsize * n_time * window))
+    per_dim = max(1, int(n_windows ** (1 / len(factors))))
+    chunks = {d: f * per_dim for d, f in factors.items()}
+    if n_windows == 1:
+        chunks[dim] = max(1, target_bytes // (itemsize * window))
+    else:
+        chunks[dim] = -1
+    return ds.chunk(chunks)
+
+
+def corr_by_sums(x, y, dim):
+    """
+    Pearson correlation of `x` and `y` along `dim`, skipping NaNs,
+    computed from sums rather than demeaned copies of the inputs.
+    """
+    valid = x.notnull() & y.notnull()
+    x = x.astype(np.float64).where(valid)
+    y = y.astype(np.float64).where(valid)
+    n = valid.sum(dim)
+    sx = x.sum(dim)
+    sy = y.sum(dim)
+    sxx = (x * x).sum(dim)
+    syy = (y * y).sum(dim)
+    sxy = (x * y).sum(dim)
+    cov = n * sxy - sx * sy
+    var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+    return (cov / np.sqrt(var)).where(n > 1)
+
+
+def coarse_correlation(ds, x_var, y_var, factors, dim='day',
+                       scheduler=None, num_workers=None, compute=True):
+    """
+    Coarsen `ds` by `factors` (trimming the edges), then correlate
+    `x_var` with `y_var` along `dim` for every coarse cell.
+
+    `scheduler` is passed to dask, so `'threads'` (the default),
+    `'processes'`, or `'synchronous'` can be used, along with
+    `num_workers`. With `compute=False` the lazy result is returned.
+    """
+    ds = chunk_for_coarsen(ds[[x_var, y_var]], factors, dim)
+    coarse = ds.coarsen(factors, boundary='trim').mean()
+    correlation = corr_by_sums(coarse[x_var], coarse[y_var], dim)
+    correlation.name = 'correlation'
+    if not compute:
+        return correlation
+    return correlation.compute(scheduler=scheduler, num_workers=num_workers)
+
+
+class StreamingRegression:
+    """
+    One pass, NaN aware accumulator for the per-pixel correlation and
+    linear regression of `y` on `x`.
+
+    Only the running count and sums (n, sum x, sum y, sum x^2,
+    sum y^2, sum xy) are kept for each pixel, so memory scales with
+    the size of the grid and not with the length of the record. Feed
+    it blocks of time steps with `update`, combine partial results
+    (e.g. from different workers) with `merge`, and get the maps out
+    with `result`.
+    """
+
+    def __init__(self, shape):
+        self.n = np.zeros(shape, dtype=np.int64)
+        self.sx = np.zeros(shape, dtype=np.float64)
+        self.sy = np.zeros(shape, dtype=np.float64)
+        self.sxx = np.zeros(shape, dtype=np.float64)
+        self.syy = np.zeros(shape, dtype=np.float64)
+        self.sxy = np.zeros(shape, dtype=np.float64)
+
+    def update(self, x, y, axis=0):
+        """Add a block of time steps, stacked along `axis`."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        x = np.where(valid, x, 0.0)
+        y = np.where(valid, y, 0.0)
+        self.n += valid.sum(axis=axis)
+        self.sx += x.sum(axis=axis)
+        self.sy += y.sum(axis=axis)
+        self.sxx += (x * x).sum(axis=axis)
+        self.syy += (y * y).sum(axis=axis)
+        self.sxy += (x * y).sum(axis=axis)
+        return self
+
+    def merge(self, other):
+        """Combine with another accumulator over the same grid."""
+        for name in ('n', 'sx', 'sy', 'sxx', 'syy', 'sxy'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def result(self):
+        """
+        Return a dict of `correlation`, `slope`, `intercept`, `r2` and
+        `n` maps. Pixels with fewer than two valid time steps, or no
+        variation, are NaN.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n = np.where(self.n > 1, self.n, np.nan)
+            cov = n * self.sxy - self.sx * self.sy
+            var_x = n * self.sxx - self.sx ** 2
+            var_y = n * self.syy - self.sy ** 2
+            correlation = cov / np.sqrt(var_x * var_y)
+            slope = cov / var_x
+            intercept = (self.sy - slope * self.sx) / n
+        return {
+            'correlation': correlation,
+            'slope': slope,
+            'intercept': intercept,
+            'r2': correlation ** 2,
+            'n': self.n,
+        }
+
+
+def streaming_regression(x, y, dim='day', block_size=365):
+    """
+    Per-pixel correlation and regression of DataArray `y` on `x`
+    along `dim`, reading `block_size` time steps at a time. With
+    dask or file backed inputs only one block is ever in memory.
+
+    Returns a Dataset with `correlation`, `slope`, `intercept`, `r2`
+    and `n` maps on the remaining dimensions.
+    """
+    y = y.transpose(*x.dims)
+    axis = x.get_axis_num(dim)
+    shape = tuple(s for d, s in x.sizes.items() if d != dim)
+    accumulator = StreamingRegression(shape)
+    for start in range(0, x.sizes[dim], block_size):
+        block = {dim: slice(start, start + block_size)}
+        accumulator.update(
+            x.isel(block).values, y.isel(block).values, axis=axis)
+    dims = [d for d in x.dims if d != dim]
+    coords = {d: x[d] for d in dims if d in x.coords}
+    return xr.Dataset(
+        {name: (dims, values)
+         for name, values in accumulator.result().items()},
+        coords=coords
+    )
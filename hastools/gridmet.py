@@ -0,0 +1,324 @@
+"""
+Helpers for downloading GridMET daily meteorology, which is served
+as one NetCDF file per variable and year:
+https://www.climatologylab.org/gridmet.html
+"""
+import concurrent.futures
+import datetime
+import logging
+import os
+
+import numpy as np
+import requests
+import xarray as xr
+
+from .download import TIMEOUT, get_session
+from .geometry import as_latlon_geometry, contains_latlon
+
+GRIDMET_URL = 'https://www.northwestknowledge.net/metdata/data'
+CHUNK_SIZE = 2 ** 20
+MAX_WORKERS = 8
+# GridMET adds new days with a lag of a few days, so last year's file
+# can still change for a while into January. Files for years that
+# ended longer ago than this are never rewritten.
+REVISION_DAYS = 30
+
+logger = logging.getLogger(__name__)
+
+# Chunk shapes for the Zarr copies of the data. The "map" layout keeps
+# whole lat/lon slices together for a few days at a time, which is
+# fast for spatial plots and averages. The "timeseries" layout keeps
+# the full record for small blocks of pixels, which is fast for
+# pulling out point time series and per-pixel statistics.
+ZARR_CHUNKS = {
+    'map': {'day': 8, 'lat': -1, 'lon': -1},
+    'timeseries': {'day': -1, 'lat': 25, 'lon': 25},
+}
+# Encoding settings carried over from the NetCDF files, so the Zarr
+# store keeps the same packed storage
+KEEP_ENCODING = ('dtype', 'scale_factor', 'add_offset', '_FillValue',
+                 'missing_value', 'units', 'calendar')
+
+# The first bytes of a NetCDF3 or NetCDF4 (HDF5) file
+NETCDF_SIGNATURES = (b'CDF\x01', b'CDF\x02', b'CDF\x05', b'\x89HDF')
+
+
+def gridmet_filename(variable, year):
+    return f'{variable}_{year}.nc'
+
+
+def is_final(year):
+    """Whether GridMET has stopped rewriting the file for `year`."""
+    settled = datetime.date.today() - datetime.timedelta(days=REVISION_DAYS)
+    return year < settled.year
+
+
+def is_netcdf(path):
+    """Check that `path` at least starts like a NetCDF file."""
+    with open(path, 'rb') as f:
+        return f.read(4) in NETCDF_SIGNATURES
+
+
+def validator(headers):
+    """
+    The strong ETag, or else the Last-Modified date, from response
+    `headers`, which identifies the version of a file for `If-Range`.
+    None if the server gives neither.
+    """
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def remote_info(url, session=None):
+    """
+    The (size in bytes, validator) of the file at `url`, either of
+    which may be None if the server doesn't report it.
+    """
+    session = session or get_session()
+    response = session.head(
+        url, headers={'Accept-Encoding': 'identity'}, timeout=TIMEOUT,
+        allow_redirects=True)
+    response.raise_for_status()
+    size = response.headers.get('Content-Length')
+    size = int(size) if size is not None else None
+    return size, validator(response.headers)
+
+
+def _read_validator(path):
+    try:
+        with open(path) as f:
+            return f.read() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_validator(path, value):
+    with open(path, 'w') as f:
+        f.write(value or '')
+
+
+def download_gridmet_variable(variable, year, directory='.', session=None):
+    """
+    Download the GridMET file for `variable` and `year` into
+    `directory` and return its path.
+
+    Data is written to a `.part` file first and only renamed into
+    place once its size matches what the server reported and it looks
+    like a NetCDF file, so an interrupted download never leaves a
+    truncated file behind. If a `.part` file is already there, the
+    download picks up where it left off with an HTTP Range request.
+
+    GridMET rewrites the files for the current year as new days are
+    added, so the server's ETag (or Last-Modified date) is saved next
+    to the `.part` file and sent back with `If-Range`: a partial
+    download of an older version of the file starts again from the
+    beginning. An existing complete file whose size no longer matches
+    the server's is downloaded again in full, never resumed.
+
+    Complete files for past years (see `is_final`) are returned
+    without asking the server. If the server can't be reached, an
+    existing complete file is returned as it is, so re-running works
+    offline.
+    """
+    session = session or get_session()
+    os.makedirs(directory, exist_ok=True)
+    filename = gridmet_filename(variable, year)
+    path = os.path.join(directory, filename)
+    part = f'{path}.part'
+    part_validator = f'{part}.validator'
+    url = f'{GRIDMET_URL}/{filename}'
+    have_file = os.path.exists(path) and is_netcdf(path)
+    if have_file and is_final(year):
+        return path
+    try:
+        expected, current = remote_info(url, session)
+    except requests.RequestException as e:
+        if not have_file:
+            raise
+        logger.warning('Could not check %s for updates: %s', filename, e)
+        return path
+
+    if have_file and (expected is None
+                      or os.path.getsize(path) == expected):
+        return path
+
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    saved = _read_validator(part_validator)
+    if (expected is not None and offset > expected) or (
+            current is None or saved != current):
+        # Can't tell that the partial file is from this version
+        offset = 0
+    if expected is None or offset < expected:
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = current
+        logger.info('Downloading %s for %s', variable, year)
+        with session.get(url, headers=headers, stream=True,
+                         timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            if response.status_code == 206:
+                # Content-Range is `bytes start-end/total`
+                total = response.headers['Content-Range'].rpartition('/')[2]
+                mode = 'ab'
+            else:
+                # The file changed since the partial download, or the
+                # server ignored the Range header, so start over
+                total = response.headers.get('Content-Length')
+                mode = 'wb'
+                _write_validator(part_validator, validator(response.headers))
+            if total not in (None, '*'):
+                expected = int(total)
+            with open(part, mode) as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+
+    size = os.path.getsize(part)
+    if expected is not None and size != expected:
+        raise IOError(
+            f'Incomplete download of {filename}: got {size} of '
+            f'{expected} bytes, run again to resume'
+        )
+    if not is_netcdf(part):
+        os.remove(part)
+        raise IOError(f'Downloaded {filename} is not a NetCDF file')
+    os.replace(part, path)
+    if os.path.exists(part_validator):
+        os.remove(part_validator)
+    return path
+
+
+def download_gridmet(variables, years, directory='.',
+                     max_workers=MAX_WORKERS, session=None, progress=None):
+    """
+    Download every (variable, year) combination concurrently with
+    `download_gridmet_variable`. Returns the file paths, ordered by
+    variable and then year. If given, `progress(n_done, n_total,
+    path)` is called as each file is ready.
+    """
+    pairs = [(v, y) for v in variables for y in years]
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        futures = [
+            pool.submit(download_gridmet_variable, v, y, directory, session)
+            for v, y in pairs
+        ]
+        if progress is not None:
+            done = concurrent.futures.as_completed(futures)
+            for n_done, future in enumerate(done, 1):
+                progress(n_done, len(futures), future.result())
+        return [future.result() for future in futures]
+
+
+def open_gridmet(files, **kwargs):
+    """
+    Open a set of per-variable, per-year GridMET files as a single
+    dataset, dropping the unused `crs` variable. The files all share
+    the same grid, so coordinates are taken from the first file rather
+    than compared across every file.
+    """
+    kwargs = {'data_vars': 'minimal', 'coords': 'minimal',
+              'compat': 'override', **kwargs}
+    ds = xr.open_mfdataset(files, combine='by_coords', **kwargs)
+    return ds.drop_vars('crs', errors='ignore')
+
+
+def gridmet_to_zarr(files, store, layout='map', chunks=None):
+    """
+    Consolidate GridMET NetCDF `files` into one Zarr `store`, chunked
+    for the given `layout` (see `ZARR_CHUNKS`), or with explicit
+    `chunks`. Metadata is consolidated so that opening the store only
+    reads a single small file. Consolidated metadata is only part of
+    the Zarr version 2 format, so the store is written in that format.
+    """
+    ds = open_gridmet(files)
+    ds = ds.chunk(chunks or ZARR_CHUNKS[layout])
+    for var in ds.variables.values():
+        var.encoding = {
+            k: v for k, v in var.encoding.items() if k in KEEP_ENCODING
+        }
+    ds.to_zarr(store, mode='w', consolidated=True, zarr_format=2)
+    return store
+
+
+def gridmet_to_zarr_layouts(files, directory, layouts=('map', 'timeseries')):
+    """
+    Write one Zarr copy of the GridMET `files` per layout into
+    `directory`, named `gridmet_{layout}.zarr`. Returns a dict of
+    layout -> store path.
+    """
+    return {
+        layout: gridmet_to_zarr(
+            files, os.path.join(directory, f'gridmet_{layout}.zarr'), layout)
+        for layout in layouts
+    }
+
+
+def open_gridmet_zarr(store, **kwargs):
+    """Open a Zarr store written by `gridmet_to_zarr`."""
+    return xr.open_zarr(store, consolidated=True, zarr_format=2, **kwargs)
+
+
+def bbox_indexers(lat, lon, bbox):
+    """
+    Index slices selecting the (west, south, east, north) `bbox` from
+    1d `lat` and `lon` coordinates, which may run in either direction.
+    """
+    west, south, east, north = bbox
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    lat_idx = np.flatnonzero((lat >= south) & (lat <= north))
+    lon_idx = np.flatnonzero((lon >= west) & (lon <= east))
+    if not len(lat_idx) or not len(lon_idx):
+        raise ValueError(f'No grid cells inside the bounding box {bbox}')
+    return {
+        'lat': slice(lat_idx[0], lat_idx[-1] + 1),
+        'lon': slice(lon_idx[0], lon_idx[-1] + 1),
+    }
+
+
+def open_gridmet_subset(source, bbox=None, geometry=None, chunks=None):
+    """
+    Open only the part of the GridMET data inside a bounding box or
+    geometry, without reading the rest of the grid.
+
+    `source` is either a list of NetCDF files or the path of a Zarr
+    store from `gridmet_to_zarr`. Give either a `bbox` as (west, south,
+    east, north) in degrees, or a `geometry` such as a HUC8 polygon
+    from `WBDHU8` (a shapely geometry in lat/lon, or a GeoSeries/
+    GeoDataFrame). For a geometry, cells outside of it are set to NaN
+    so that e.g. `.mean(['lat', 'lon'])` gives the basin average.
+
+    The subset is selected by index before any data is read, so for
+    NetCDF files only the matching hyperslab of each file is read, and
+    for a Zarr store only the intersecting chunks are.
+    """
+    if geometry is not None:
+        geometry = as_latlon_geometry(geometry)
+        bbox = geometry.bounds
+    if bbox is None:
+        raise ValueError('Either a bbox or a geometry is needed')
+
+    if isinstance(source, (str, os.PathLike)):
+        ds = open_gridmet_zarr(source)
+        ds = ds.isel(bbox_indexers(ds['lat'], ds['lon'], bbox))
+    else:
+        # Opening without dask keeps the arrays lazily indexed, so the
+        # `isel` below is passed straight down to the file reads
+        datasets = [
+            xr.open_dataset(f).drop_vars('crs', errors='ignore')
+            for f in source
+        ]
+        indexers = bbox_indexers(datasets[0]['lat'], datasets[0]['lon'], bbox)
+        ds = xr.combine_by_coords(
+            [d.isel(indexers) for d in datasets],
+            data_vars='minimal', coords='minimal', compat='override'
+        )
+
+    if geometry is not None:
+        inside = contains_latlon(geometry, ds['lat'], ds['lon'])
+        ds = ds.where(xr.DataArray(inside, dims=('lat', 'lon')))
+    if chunks is not None:
+        ds = ds.chunk(chunks)
+    return ds
@@ -0,0 +1,134 @@
+"""
+A local, append-only store of gauge history.
+
+Each site gets its own directory with one Parquet file per calendar
+year. New data only rewrites the years it touches, so refreshing a
+30 year record with the latest week writes one small file instead
+of the whole history.
+
+Alongside the data, each site keeps a `coverage.json` listing the
+date ranges that have been requested for it. A gauge whose record
+starts after the requested begin date then isn't asked for the same
+empty range again on every refresh.
+"""
+import json
+import os
+
+import pandas as pd
+
+from .cache import CACHE_DIR
+
+STORE_DIR = os.path.join(CACHE_DIR, 'store')
+
+_stores = {}
+
+
+class GaugeStore:
+    """Per-site, per-year Parquet partitions under `directory`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _site_dir(self, site):
+        return os.path.join(self.directory, str(site))
+
+    def _path(self, site, year):
+        return os.path.join(self._site_dir(site), f'{year}.parquet')
+
+    def _coverage_path(self, site):
+        return os.path.join(self._site_dir(site), 'coverage.json')
+
+    def years(self, site):
+        """Sorted list of the years stored for `site`."""
+        try:
+            names = os.listdir(self._site_dir(site))
+        except FileNotFoundError:
+            return []
+        return sorted(
+            int(name[:-len('.parquet')])
+            for name in names if name.endswith('.parquet')
+        )
+
+    def coverage(self, site):
+        """
+        Sorted, non-overlapping list of the (begin, end) date ranges
+        that have been downloaded for `site`, whether or not they held
+        any data. Falls back to the stored date range for sites
+        written before coverage was recorded.
+        """
+        try:
+            with open(self._coverage_path(site)) as f:
+                ranges = json.load(f)
+        except FileNotFoundError:
+            stored = self.date_range(site)
+            return [stored] if stored is not None else []
+        return [(pd.Timestamp(b), pd.Timestamp(e)) for b, e in ranges]
+
+    def add_coverage(self, site, begin_date, end_date):
+        """Record that `site` has been downloaded from begin to end."""
+        ranges = self.coverage(site) + [
+            (pd.Timestamp(begin_date), pd.Timestamp(end_date))]
+        merged = []
+        for begin, end in sorted(ranges):
+            # Merge overlapping and back to back ranges
+            if merged and begin <= merged[-1][1] + pd.Timedelta(days=1):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((begin, end))
+        os.makedirs(self._site_dir(site), exist_ok=True)
+        path = self._coverage_path(site)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump([[b.isoformat(), e.isoformat()] for b, e in merged], f)
+        os.replace(f'{path}.tmp', path)
+
+    def date_range(self, site):
+        """
+        Return the (first, last) dates stored for `site`, or None if
+        nothing is stored. Only the first and last years are read.
+        """
+        years = self.years(site)
+        if not years:
+            return None
+        first = pd.read_parquet(self._path(site, years[0])).index.min()
+        last = pd.read_parquet(self._path(site, years[-1])).index.max()
+        return first, last
+
+    def write(self, site, df):
+        """
+        Merge `df` (indexed by date) into the store. Rows in `df`
+        replace stored rows with the same date, so revised provisional
+        values overwrite the old ones. Only touched years are rewritten.
+        """
+        os.makedirs(self._site_dir(site), exist_ok=True)
+        for year, new in df.groupby(df.index.year):
+            path = self._path(site, year)
+            if os.path.exists(path):
+                old = pd.read_parquet(path)
+                old = old[~old.index.isin(new.index)]
+                new = pd.concat([old, new])
+            new = new.sort_index()
+            new.to_parquet(f'{path}.tmp')
+            os.replace(f'{path}.tmp', path)
+
+    def read(self, site, begin_date=None, end_date=None):
+        """Read the stored rows for `site` between the given dates."""
+        begin = pd.Timestamp(begin_date) if begin_date is not None else None
+        end = pd.Timestamp(end_date) if end_date is not None else None
+        years = [
+            year for year in self.years(site)
+            if (begin is None or year >= begin.year)
+            and (end is None or year <= end.year)
+        ]
+        if not years:
+            return None
+        df = pd.concat(
+            [pd.read_parquet(self._path(site, year)) for year in years])
+        return df.loc[begin:end]
+
+
+def get_store(directory=STORE_DIR):
+    """Return the `GaugeStore` for `directory`, creating it if needed."""
+    if directory not in _stores:
+        _stores[directory] = GaugeStore(directory)
+    return _stores[directory]
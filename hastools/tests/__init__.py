@@ -0,0 +1,2 @@
+# Tests for hastools, run with `python -m pytest hastools` from the
+# root of the repository.
@@ -0,0 +1,159 @@
+"""
+Local stand-in HTTP server for the download tests.
+
+Paths understood by the server:
+
+  /delay/<seconds>/<name>   wait, then answer with body `name`
+  /wait/<n>/<name>          hold the request until `n` requests are
+                            being handled at once (at most 5 seconds)
+  /flaky/<n>/<name>         answer 503 for the first `n` requests
+  /status/<code>            answer with the given status code
+  /nwis/dv/?sites=...       NWIS style daily values RDB, with records
+                            that start on `server.record_start`, and
+                            none for the sites in `server.inactive`
+                            (404 if no site in the request has data)
+  /nwis/iv/?sites=...       the same with 6 hourly instantaneous values
+  /files/<name>             `server.files[name]`, with HEAD, ETag,
+                            Range and If-Range support
+
+Requests are recorded in `server.requests` as (time, path), except
+for /files requests which go in `server.headers` as (method,
+headers). The largest number of requests handled at once is kept in
+`server.max_active`.
+"""
+import http.server
+import socketserver
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import pandas as pd
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        with self.server.lock:
+            self.server.headers.append(('HEAD', dict(self.headers)))
+        self._send_file(head=True)
+
+    def do_GET(self):
+        server = self.server
+        if self.path.startswith('/files/'):
+            with server.lock:
+                server.headers.append(('GET', dict(self.headers)))
+            return self._send_file()
+        with server.lock:
+            server.requests.append((time.monotonic(), self.path))
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            self._respond(hits)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _respond(self, hits):
+        parts = self.path.strip('/').split('/')
+        status, body = 200, parts[-1]
+        if parts[0] == 'delay':
+            time.sleep(float(parts[1]))
+        elif parts[0] == 'wait':
+            deadline = time.monotonic() + 5
+            while (self.server.max_active < int(parts[1])
+                   and time.monotonic() < deadline):
+                time.sleep(0.01)
+        elif parts[0] == 'flaky' and hits <= int(parts[1]):
+            status = 503
+        elif parts[0] == 'status':
+            status = int(parts[1])
+        elif parts[0] == 'nwis':
+            body = self._nwis_rdb()
+            if not body:
+                status, body = 404, 'No sites found matching all criteria'
+
+        body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, head=False):
+        body, etag = self.server.files[self.path.rpartition('/')[2]]
+        start = 0
+        status = 200
+        byte_range = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if byte_range and not head and if_range in (None, etag):
+            start = int(byte_range[len('bytes='):].rstrip('-'))
+            status = 206
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body) - start))
+        if status == 206:
+            self.send_header(
+                'Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+        self.end_headers()
+        if not head:
+            self.wfile.write(body[start:])
+
+    def _nwis_rdb(self):
+        query = dict(parse_qsl(urlsplit(self.path).query))
+        begin = max(pd.Timestamp(query['startDT']), self.server.record_start)
+        if self.path.startswith('/nwis/iv/'):
+            times = pd.date_range(begin, query['endDT'], freq='6h')
+            stamps = times.strftime('%Y-%m-%d %H:%M')
+        else:
+            times = pd.date_range(begin, query['endDT'])
+            stamps = times.strftime('%Y-%m-%d')
+        lines = []
+        for site in query['sites'].split(','):
+            if site in self.server.inactive:
+                continue
+            lines += [
+                '# stand-in NWIS response',
+                'agency_cd\tsite_no\tdatetime\tx_00060_00003\tx_00060_00003_cd',
+                '5s\t15s\t20d\t14n\t10s',
+            ]
+            lines += [
+                f'USGS\t{site}\t{stamp}\t{when.day}\tA'
+                for when, stamp in zip(times, stamps)
+            ]
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    # Room for many clients connecting at once
+    request_queue_size = 128
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.hits = {}
+        self.active = 0
+        self.max_active = 0
+        self.record_start = pd.Timestamp('1900-01-01')
+        self.inactive = set()
+        self.headers = []
+        self.files = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
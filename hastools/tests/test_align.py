@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hastools.align import align_daymet_usgs
+from hastools.daymet import daymet_dates
+
+T = pd.Timestamp
+
+
+@pytest.fixture
+def daymet():
+    # 2019 and the leap year 2020 on the DayMet 365 day calendar
+    year = np.repeat([2019, 2020], 365)
+    yday = np.tile(np.arange(1, 366), 2)
+    index = pd.DatetimeIndex(daymet_dates(year, yday), name='date')
+    return pd.DataFrame({'tmax': np.arange(730.0)}, index=index)
+
+
+@pytest.fixture
+def usgs():
+    index = pd.date_range('2019-01-01', '2020-12-31', name='date')
+    return pd.DataFrame({'streamflow': np.arange(len(index)) + 0.5},
+                        index=index)
+
+
+def test_drop_leaves_out_dec31_of_leap_years(daymet, usgs):
+    df = align_daymet_usgs(daymet, usgs)
+    assert len(df) == 730
+    assert T('2020-12-31') not in df.index
+    assert T('2019-12-31') in df.index
+    assert T('2020-02-29') in df.index
+    np.testing.assert_array_equal(
+        df['streamflow'], usgs['streamflow'].loc[df.index])
+    np.testing.assert_array_equal(df['tmax'], daymet['tmax'])
+
+
+def test_fill_borrows_dec30(daymet, usgs):
+    df = align_daymet_usgs(daymet, usgs, leap_day='fill')
+    assert df.index.equals(usgs.index)
+    assert df.loc['2020-12-31', 'tmax'] == daymet.loc['2020-12-30', 'tmax']
+    assert df.loc['2020-12-31', 'streamflow'] == usgs['streamflow'].iloc[-1]
+
+
+def test_fill_only_borrows_for_dec31(daymet, usgs):
+    # A day missing from DayMet for another reason is left out
+    df = align_daymet_usgs(
+        daymet.drop(T('2019-06-01')), usgs, leap_day='fill')
+    assert T('2019-06-01') not in df.index
+    assert len(df) == len(usgs) - 1
+
+
+@pytest.mark.parametrize('leap_day', ['drop', 'fill'])
+def test_result_shares_memory_with_inputs(daymet, usgs, leap_day):
+    df = align_daymet_usgs(daymet, usgs, leap_day=leap_day)
+    if leap_day == 'drop':
+        # Both sides match one contiguous run of DayMet rows
+        assert np.shares_memory(
+            df['tmax'].to_numpy(), daymet['tmax'].to_numpy())
+    trimmed = usgs.loc['2019-03-01':'2019-12-31']
+    df = align_daymet_usgs(daymet, trimmed, leap_day=leap_day)
+    assert np.shares_memory(df['tmax'].to_numpy(), daymet['tmax'].to_numpy())
+    assert np.shares_memory(
+        df['streamflow'].to_numpy(), usgs['streamflow'].to_numpy())
+
+
+@pytest.mark.parametrize('leap_day', ['drop', 'fill'])
+def test_empty_daymet(daymet, usgs, leap_day):
+    df = align_daymet_usgs(daymet.iloc[:0], usgs, leap_day=leap_day)
+    assert df.empty
+    assert list(df.columns) == ['tmax', 'streamflow']
+
+
+def test_unknown_leap_day_option(daymet, usgs):
+    with pytest.raises(ValueError):
+        align_daymet_usgs(daymet, usgs, leap_day='interpolate')
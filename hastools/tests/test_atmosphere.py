@@ -0,0 +1,53 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from hastools.atmosphere import EXPONENT, P0, air_pressure_at_height
+
+
+def reference(h, T=273.0):
+    return P0 * math.exp(EXPONENT * h / T)
+
+
+def test_scalars_give_python_floats():
+    result = air_pressure_at_height(1000)
+    assert type(result) is float
+    assert result == pytest.approx(reference(1000))
+    assert air_pressure_at_height(0, 250.0) == P0
+
+
+@pytest.mark.parametrize('h', [[0, 1000], (0, 1000), np.array([0, 1000])])
+def test_sequences_match_scalars(h):
+    result = air_pressure_at_height(h, [273.0, 250.0])
+    assert result.dtype == np.float64
+    np.testing.assert_allclose(
+        result, [reference(0), reference(1000, 250.0)])
+
+
+def test_float32_stays_float32():
+    h = np.arange(0, 5000, 1000, dtype=np.float32)
+    assert air_pressure_at_height(h).dtype == np.float32
+    assert air_pressure_at_height(np.float32(1000)).dtype == np.float32
+
+
+def test_broadcast_into_out():
+    h = np.array([0.0, 1000.0, 2000.0])
+    T = np.array([[250.0], [300.0]])
+    out = np.empty((2, 3))
+    assert air_pressure_at_height(h, T, out=out) is out
+    np.testing.assert_allclose(out[1, 2], reference(2000, 300.0))
+
+
+def test_pandas_and_xarray_keep_labels():
+    h = pd.Series([0.0, 1000.0], index=['a', 'b'])
+    result = air_pressure_at_height(h)
+    assert result.index.equals(h.index)
+    assert result['b'] == pytest.approx(reference(1000))
+
+    T = xr.DataArray([250.0, 300.0], dims='time')
+    result = air_pressure_at_height(xr.DataArray([0.0, 1000.0], dims='z'), T)
+    assert result.dims == ('z', 'time')
+    assert float(result[1, 0]) == pytest.approx(reference(1000, 250.0))
@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+
+from hastools import cache as cache_module
+from hastools.cache import ResponseCache, cache_key
+from hastools.usgs import usgs_cache_key
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame(
+        {'streamflow': range(100)},
+        index=pd.date_range('2000-01-01', periods=100, name='date'))
+
+
+def test_key_normalization():
+    key = cache_key('usgs_dv', site='09506000', parameter='00060')
+    assert key == cache_key('usgs_dv', parameter='00060', site='09506000')
+    assert key == cache_key('usgs_dv', site='09506000', parameter='00060',
+                            stat=None)
+    assert cache_key('usgs_dv', site=9506000) == cache_key(
+        'usgs_dv', site='9506000')
+    assert key != cache_key('usgs_iv', site='09506000', parameter='00060')
+    assert key != cache_key('usgs_dv', site='09506001', parameter='00060')
+    assert usgs_cache_key('1', '2000-01-01', '2000-12-31') == usgs_cache_key(
+        '1', pd.Timestamp('2000-01-01'), pd.Timestamp('2000-12-31 00:00'))
+
+
+def test_round_trip(tmp_path, frame):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get('key') is None
+    cache.put('key', frame)
+    # Parquet doesn't keep the index frequency
+    pd.testing.assert_frame_equal(cache.get('key'), frame, check_freq=False)
+
+
+def test_provisional_entries_expire(tmp_path, frame, monkeypatch):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    now = 1_000_000.0
+    monkeypatch.setattr(cache_module.time, 'time', lambda: now)
+    cache.put('recent', frame, provisional=True)
+    cache.put('old', frame)
+    now += 59
+    assert cache.get('recent') is not None
+    now += 2
+    assert cache.get('recent') is None
+    assert not os.path.exists(tmp_path / 'recent.parquet')
+    now += 10 ** 9
+    assert cache.get('old') is not None
+
+
+def test_least_recently_used_is_evicted(tmp_path, frame):
+    cache = ResponseCache(str(tmp_path))
+    cache.put('a', frame)
+    size = os.path.getsize(tmp_path / 'a.parquet')
+    cache.max_bytes = 2 * size
+    cache.put('b', frame)
+    # Make the order of use explicit rather than relying on the clock
+    os.utime(tmp_path / 'a.parquet', (1000, 1000))
+    os.utime(tmp_path / 'b.parquet', (2000, 2000))
+    assert cache.get('a') is not None
+    cache.put('c', frame)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hastools.climatology import Climatology, group_keys
+
+
+@pytest.fixture
+def df():
+    index = pd.date_range('2001-01-01', '2010-12-31')
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'a': rng.gamma(2.0, 50.0, len(index)),
+        'b': rng.normal(size=len(index)),
+    }, index=index)
+    df.loc[rng.random(len(index)) < 0.1, 'a'] = np.nan
+    # A group without any data
+    df.loc[df.index.dayofyear == 100, 'b'] = np.nan
+    return df
+
+
+def assert_matches_groupby(clim, df, by):
+    grouped = df.groupby(group_keys(df.index, by))
+    expected = {
+        'mean': grouped.mean(),
+        'min': grouped.min(),
+        'max': grouped.max(),
+        'count': grouped.count(),
+        'median': grouped.median(),
+        **{q: grouped.quantile(q) for q in clim.quantiles},
+    }
+    for stat, values in expected.items():
+        np.testing.assert_allclose(
+            clim[stat].to_numpy(dtype=np.float64),
+            values.to_numpy(dtype=np.float64), err_msg=str(stat))
+
+
+@pytest.mark.parametrize('by', ['dayofyear', 'weekofyear', 'month'])
+def test_matches_groupby(df, by):
+    clim = Climatology(df, by, quantiles=(0.1, 0.25, 0.9))
+    assert_matches_groupby(clim, df, by)
+
+
+def test_update_matches_groupby_on_all_data(df):
+    clim = Climatology(df.loc[:'2008'])
+    clim.update(df.loc['2009':])
+    assert_matches_groupby(clim, df, 'dayofyear')
+
+
+def test_all_nan_group(df):
+    clim = Climatology(df)
+    row = clim.stats.loc[100]
+    assert row['count', 'b'] == 0
+    for stat in ('mean', 'min', 'max', 'median', 0.25):
+        assert np.isnan(row[stat, 'b'])
+    assert not np.isnan(row['mean', 'a'])
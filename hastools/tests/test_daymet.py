@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import shapely
+
+from hastools.daymet import (
+    daymet_cell_centers, daymet_cells, daymet_cells_in_geometry,
+    daymet_dates, open_daymet_dataset
+)
+
+
+def test_dates_use_the_no_leap_calendar():
+    dates = daymet_dates([2020, 2020, 2020, 2019, 2019], [1, 60, 365, 59, 365])
+    assert dates.dtype == 'datetime64[D]'
+    assert dates.astype(str).tolist() == [
+        '2020-01-01', '2020-02-29', '2020-12-30', '2019-02-28', '2019-12-31']
+
+
+@pytest.mark.parametrize('yday', [0, 366])
+def test_dates_out_of_range(yday):
+    with pytest.raises(ValueError):
+        daymet_dates([2020], [yday])
+
+
+def test_cell_centers_round_trip():
+    row, col = daymet_cells(
+        np.array([34.4483, 40.0]), np.array([-111.79, -105.3]))
+    lat, lon = daymet_cell_centers(row, col)
+    assert np.array_equal(daymet_cells(lat, lon)[0], row)
+    assert np.array_equal(daymet_cells(lat, lon)[1], col)
+
+
+def test_cells_in_geometry_centers_inside():
+    geometry = shapely.box(-111.85, 34.40, -111.75, 34.50)
+    row, col = daymet_cells_in_geometry(geometry)
+    lat, lon = daymet_cell_centers(row, col)
+    # Roughly 9 km x 11 km
+    assert 80 < len(row) < 120
+    assert shapely.contains_xy(geometry, lon, lat).all()
+
+
+def test_geometry_smaller_than_a_cell():
+    geometry = shapely.box(-111.7901, 34.4483, -111.7899, 34.4484)
+    row, col = daymet_cells_in_geometry(geometry)
+    point = geometry.representative_point()
+    expected = daymet_cells(np.array([point.y]), np.array([point.x]))
+    assert np.array_equal(row, expected[0])
+    assert np.array_equal(col, expected[1])
+
+
+def test_empty_targets_raise():
+    with pytest.raises(ValueError):
+        daymet_cells_in_geometry(shapely.Polygon())
+    with pytest.raises(ValueError):
+        open_daymet_dataset([], '2000-01-01', '2000-01-31')
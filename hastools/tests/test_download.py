@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from hastools.download import fetch_all, fetch_all_async
+from hastools.tests.server import StandInServer
+
+
+@pytest.fixture
+def server():
+    with StandInServer() as server:
+        yield server
+
+
+@pytest.fixture
+def session():
+    with requests.Session() as session:
+        yield session
+
+
+def test_results_keep_url_order(server, session):
+    # Later urls finish first
+    urls = [f'{server.url}/delay/{0.05 * (5 - i)}/body{i}' for i in range(5)]
+    assert fetch_all(urls, session=session) == [f'body{i}' for i in range(5)]
+
+
+@pytest.mark.parametrize('max_concurrency', [8, 40])
+def test_concurrency_is_bounded_and_not_capped(server, max_concurrency):
+    # 40 is more than the event loop's default executor has threads on
+    # most machines, and more than the session's initial pool. Requests
+    # are held until `max_concurrency` are in flight, so this doesn't
+    # depend on timing.
+    urls = [f'{server.url}/wait/{max_concurrency}/body{i}'
+            for i in range(2 * max_concurrency)]
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_concurrency)
+        session.mount('http://', adapter)
+        fetch_all(urls, max_concurrency=max_concurrency, session=session)
+    assert server.max_active == max_concurrency
+
+
+def test_shared_pool_grows_with_concurrency(server, caplog):
+    urls = [f'{server.url}/wait/40/body{i}' for i in range(40)]
+    fetch_all(urls, max_concurrency=40)
+    assert server.max_active == 40
+    assert 'Connection pool is full' not in caplog.text
+
+
+def test_retry_with_backoff(server, session):
+    url = f'{server.url}/flaky/2/body'
+    start = time.monotonic()
+    assert fetch_all([url], retries=2, backoff=0.1, session=session) == ['body']
+    elapsed = time.monotonic() - start
+    assert server.hits['/flaky/2/body'] == 3
+    # Waits of 0.1 then 0.2 seconds
+    assert elapsed >= 0.3
+
+
+def test_retries_exhausted(server, session):
+    url = f'{server.url}/flaky/5/body'
+    with pytest.raises(Exception, match='503'):
+        fetch_all([url], retries=1, backoff=0.01, session=session)
+    # One try and one retry, with no extra retries from the adapter
+    assert server.hits['/flaky/5/body'] == 2
+
+
+def test_client_errors_are_not_retried(server, session):
+    with pytest.raises(requests.HTTPError):
+        fetch_all([f'{server.url}/status/404'], backoff=0.01, session=session)
+    assert server.hits['/status/404'] == 1
+
+
+def test_missing_ok_gives_none_for_404(server, session):
+    urls = [f'{server.url}/status/404', f'{server.url}/delay/0/body']
+    assert fetch_all(urls, missing_ok=True, session=session) == [None, 'body']
+
+
+def test_rate_limit_per_host(server, session):
+    urls = [f'{server.url}/delay/0/body{i}' for i in range(5)]
+    fetch_all(urls, rate=10, session=session)
+    times = sorted(t for t, _ in server.requests)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert min(gaps) >= 0.09
+
+
+def test_progress_callback(server, session):
+    urls = [f'{server.url}/delay/0/body{i}' for i in range(4)]
+    calls = []
+    fetch_all(urls, session=session,
+              progress=lambda done, total, url: calls.append((done, total, url)))
+    assert [c[0] for c in calls] == [1, 2, 3, 4]
+    assert all(c[1] == 4 for c in calls)
+    assert sorted(c[2] for c in calls) == sorted(urls)
+
+
+def test_fetch_all_inside_running_loop(server, session):
+    # As in a Jupyter/VS Code interactive window
+    async def main():
+        return fetch_all([f'{server.url}/delay/0/body'], session=session)
+
+    assert asyncio.run(main()) == ['body']
+
+
+def test_async_entry_point(server, session):
+    urls = [f'{server.url}/delay/0/body{i}' for i in range(3)]
+    result = asyncio.run(fetch_all_async(urls, session=session))
+    assert result == ['body0', 'body1', 'body2']
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hastools.forecast import (
+    OnlineWeeklyRegression, backtest_weekly, fit_weekly_regressions,
+    lag_lead_matrix, week_of_year
+)
+
+
+@pytest.fixture
+def weekly():
+    # 30 years of weekly flows for three gauges of very different size
+    rng = np.random.default_rng(0)
+    index = pd.date_range('1990-01-07', '2019-12-29', freq='W')
+    season = 1 + 0.8 * np.sin(2 * np.pi * index.dayofyear / 365.25)
+    values = {}
+    for site, scale in [('09506000', 1e4), ('09505800', 1e2), ('small', 1.0)]:
+        noise = rng.lognormal(0, 0.3, len(index))
+        values[site] = scale * season * noise
+    df = pd.DataFrame(values, index=index)
+    df.iloc[rng.choice(len(df), 40, replace=False), 1] = np.nan
+    return df
+
+
+def test_weekly_regressions_match_sklearn(weekly):
+    from sklearn.linear_model import LinearRegression
+
+    table = fit_weekly_regressions(weekly, leads=(1, 2))
+    woy = week_of_year(weekly.index)
+    for site in weekly.columns:
+        values = weekly[site].to_numpy()
+        for lead in (1, 2):
+            x, y = values[:-lead], values[lead:]
+            for week in (1, 20, 38, 52):
+                rows = (woy[:-lead] == week) & ~np.isnan(x) & ~np.isnan(y)
+                model = LinearRegression().fit(x[rows, None], y[rows])
+                fit = table.loc[(site, week, lead)]
+                assert fit['n'] == rows.sum()
+                np.testing.assert_allclose(fit['slope'], model.coef_[0])
+                np.testing.assert_allclose(
+                    fit['intercept'], model.intercept_,
+                    rtol=1e-7, atol=1e-9 * np.nanmax(values))
+                np.testing.assert_allclose(
+                    fit['r2'], model.score(x[rows, None], y[rows]))
+
+
+def brute_force_backtest(values, woy, lead, min_years):
+    """Refit from scratch at every forecast date."""
+    sums = {}
+    for t in range(len(values) - lead):
+        # Pairs (s -> s + lead) already observed at time t
+        s = np.arange(t - lead + 1)
+        s = s[(woy[s] == woy[t])]
+        x, y = values[s], values[s + lead]
+        ok = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[ok], y[ok]
+        target = values[t + lead]
+        if len(x) < min_years or np.isnan(values[t]) or np.isnan(target):
+            continue
+        slope, intercept = np.polyfit(x, y, 1)
+        error = slope * values[t] + intercept - target
+        clim_error = y.mean() - target
+        count, abs_sum, sq_sum, clim_sq_sum = sums.get(woy[t], (0, 0, 0, 0))
+        sums[woy[t]] = (count + 1, abs_sum + abs(error),
+                        sq_sum + error ** 2, clim_sq_sum + clim_error ** 2)
+    return sums
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_backtest_matches_brute_force_refit(weekly, n_jobs):
+    weekly = weekly.loc['2005':]
+    table = backtest_weekly(weekly, leads=(1, 2), min_years=5, n_jobs=n_jobs)
+    woy = week_of_year(weekly.index)
+    for site in weekly.columns:
+        values = weekly[site].to_numpy()
+        for lead in (1, 2):
+            sums = brute_force_backtest(values, woy, lead, 5)
+            for week, (count, abs_sum, sq_sum, clim_sq_sum) in sums.items():
+                row = table.loc[(site, week, lead)]
+                assert row['n_forecasts'] == count
+                np.testing.assert_allclose(row['mae'], abs_sum / count)
+                np.testing.assert_allclose(
+                    row['rmse'], np.sqrt(sq_sum / count))
+                np.testing.assert_allclose(
+                    row['clim_rmse'], np.sqrt(clim_sq_sum / count))
+            # No forecasts for the weeks that never had enough pairs
+            n_forecasts = table.xs((site, lead), level=('site', 'lead'))
+            assert n_forecasts['n_forecasts'].sum() == sum(
+                count for count, *_ in sums.values())
+
+
+def test_online_regression_matches_batch_fit(weekly):
+    # Includes the large gauge (flows ~1e4) where a fixed prior drifts
+    model = OnlineWeeklyRegression.from_weekly(weekly, lead=1)
+    table = fit_weekly_regressions(weekly, leads=(1,))
+    coefficients = model.coefficients()
+    for i, site in enumerate(weekly.columns):
+        fit = table.xs((site, 1), level=('site', 'lead'))
+        np.testing.assert_allclose(coefficients[i, :, 1], fit['slope'])
+        np.testing.assert_allclose(
+            coefficients[i, :, 0], fit['intercept'],
+            rtol=1e-7, atol=1e-9 * weekly[site].max())
+
+
+def test_online_updates_match_replay(weekly):
+    full = OnlineWeeklyRegression.from_weekly(weekly, lead=1)
+    model = OnlineWeeklyRegression.from_weekly(weekly.iloc[:-10], lead=1)
+    # Add the last 10 weeks one at a time
+    for end in range(len(weekly) - 9, len(weekly) + 1):
+        model.observe(weekly.iloc[end - 2:end], lead=1)
+    np.testing.assert_allclose(model.coefficients(), full.coefficients())
+    assert (model.n == full.n).all()
+
+
+def test_online_forgetting_is_weighted_least_squares():
+    rng = np.random.default_rng(1)
+    x = rng.normal(100, 10, 40)
+    y = 3 * x + rng.normal(0, 5, 40)
+    model = OnlineWeeklyRegression(['site'], forgetting=0.9)
+    for xi, yi in zip(x, y):
+        model.update(10, [xi], [yi])
+    weights = 0.9 ** np.arange(len(x))[::-1]
+    slope, intercept = np.polyfit(x, y, 1, w=np.sqrt(weights))
+    np.testing.assert_allclose(
+        model.coefficients(10)[0], [intercept, slope])
+
+
+def test_online_predict_without_data_is_nan():
+    model = OnlineWeeklyRegression(['a', 'b'])
+    model.update(5, [1.0, np.nan], [2.0, 3.0])
+    model.update(5, [2.0, np.nan], [4.0, 3.0])
+    assert model.n[:, 4].tolist() == [2, 0]
+    prediction = model.predict(5, [3.0, 3.0])
+    np.testing.assert_allclose(prediction[0], 6.0)
+    assert np.isnan(prediction[1])
+    assert np.isnan(model.predict(6, [3.0, 3.0])).all()
+
+
+def test_online_save_and_load(weekly, tmp_path):
+    model = OnlineWeeklyRegression.from_weekly(weekly, lead=2)
+    model.save(tmp_path / 'models')
+    for path in (tmp_path / 'models', tmp_path / 'models.npz'):
+        loaded = OnlineWeeklyRegression.load(path)
+        np.testing.assert_array_equal(
+            loaded.coefficients(), model.coefficients())
+        assert list(loaded.sites) == list(weekly.columns)
+
+
+def test_online_keeps_non_string_site_labels(weekly, tmp_path):
+    numbered = weekly.set_axis([9506000, 9498500, 9508500], axis=1)
+    model = OnlineWeeklyRegression.from_weekly(numbered)
+    expected = OnlineWeeklyRegression.from_weekly(weekly)
+    np.testing.assert_array_equal(
+        model.coefficients(), expected.coefficients())
+    model.observe(numbered.iloc[-2:])
+    model.save(tmp_path / 'models')
+    loaded = OnlineWeeklyRegression.load(tmp_path / 'models')
+    assert list(loaded.sites) == [9506000, 9498500, 9508500]
+    loaded.observe(numbered.iloc[-2:])
+
+    series = OnlineWeeklyRegression.from_weekly(
+        numbered[9506000].rename(9506000))
+    np.testing.assert_array_equal(
+        series.coefficients()[0], expected.coefficients()[0])
+
+
+@pytest.mark.parametrize('lags, leads, weekofyear', [
+    (1, 1, None), (3, 2, None), (2, 4, [10, 11, 12]),
+])
+def test_lag_lead_matrix_matches_shift(weekly, lags, leads, weekofyear):
+    series = weekly['09505800']
+    x, y, dates = lag_lead_matrix(series, lags, leads, weekofyear)
+    columns = {f'x{k}': series.shift(lags - 1 - k) for k in range(lags)}
+    columns.update({f'y{k}': series.shift(-1 - k) for k in range(leads)})
+    expected = pd.DataFrame(columns).dropna()
+    if weekofyear is not None:
+        expected = expected[
+            np.isin(week_of_year(expected.index), weekofyear)]
+    assert dates.equals(expected.index)
+    np.testing.assert_array_equal(x, expected.filter(like='x'))
+    np.testing.assert_array_equal(y, expected.filter(like='y'))
+
+
+def test_lag_lead_matrix_of_short_series(weekly):
+    x, y, dates = lag_lead_matrix(weekly['small'].iloc[:3], lags=2, leads=2)
+    assert x.shape == (0, 2) and y.shape == (0, 2) and len(dates) == 0
+    x, y, dates = lag_lead_matrix(weekly['small'].iloc[:4], lags=2, leads=2)
+    assert x.shape == (1, 2) and dates[0] == weekly.index[1]
+    with pytest.raises(ValueError):
+        lag_lead_matrix(weekly['small'], lags=0)
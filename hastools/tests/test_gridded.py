@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from hastools.gridded import (
+    StreamingRegression, chunk_for_coarsen, coarse_correlation,
+    streaming_regression
+)
+
+
+@pytest.fixture
+def ds():
+    rng = np.random.default_rng(0)
+    shape = (400, 12, 10)
+    x = rng.normal(size=shape)
+    y = 0.5 * x + rng.normal(size=shape) + np.linspace(0, 2, 10)
+    x[rng.random(shape) < 0.05] = np.nan
+    y[rng.random(shape) < 0.05] = np.nan
+    # A pixel without any data
+    x[:, 0, 0] = np.nan
+    dims = ('day', 'lat', 'lon')
+    return xr.Dataset(
+        {'x': (dims, x), 'y': (dims, y)},
+        coords={'lat': np.arange(12.0), 'lon': np.arange(10.0)})
+
+
+def test_streaming_regression_matches_corr_and_polyfit(ds):
+    result = streaming_regression(ds['x'], ds['y'], block_size=64)
+    expected = xr.corr(ds['x'], ds['y'], dim='day')
+    np.testing.assert_allclose(
+        result['correlation'], expected, rtol=1e-10, atol=1e-12)
+    np.testing.assert_allclose(result['r2'], expected ** 2, rtol=1e-10)
+    assert np.isnan(result['correlation'][0, 0])
+    assert result['n'][0, 0] == 0
+    for lat, lon in [(1, 2), (11, 9)]:
+        x = ds['x'][:, lat, lon].values
+        y = ds['y'][:, lat, lon].values
+        valid = ~(np.isnan(x) | np.isnan(y))
+        slope, intercept = np.polyfit(x[valid], y[valid], 1)
+        np.testing.assert_allclose(result['slope'][lat, lon], slope)
+        np.testing.assert_allclose(result['intercept'][lat, lon], intercept)
+        assert result['n'][lat, lon] == valid.sum()
+
+
+def test_merged_blocks_match_one_pass(ds):
+    x, y = ds['x'].values, ds['y'].values
+    whole = StreamingRegression(x.shape[1:]).update(x, y).result()
+    first = StreamingRegression(x.shape[1:]).update(x[:150], y[:150])
+    second = StreamingRegression(x.shape[1:]).update(x[150:], y[150:])
+    merged = first.merge(second).result()
+    for name, values in whole.items():
+        np.testing.assert_allclose(merged[name], values, rtol=1e-12)
+
+
+@pytest.mark.parametrize('scheduler', ['threads', 'synchronous'])
+def test_coarse_correlation_matches_xr_corr(ds, scheduler):
+    factors = {'lat': 4, 'lon': 3}
+    result = coarse_correlation(ds, 'x', 'y', factors, scheduler=scheduler)
+    coarse = ds.coarsen(factors, boundary='trim').mean()
+    expected = xr.corr(coarse['x'], coarse['y'], dim='day')
+    assert result.shape == (3, 3)
+    np.testing.assert_allclose(result, expected, rtol=1e-10)
+    np.testing.assert_array_equal(result['lon'], expected['lon'])
+
+
+@pytest.mark.parametrize('target_bytes, split_time', [
+    (2 ** 26, False), (2 ** 16, False), (2 ** 10, True),
+])
+def test_chunks_line_up_with_windows(ds, target_bytes, split_time):
+    factors = {'lat': 4, 'lon': 3}
+    chunked = chunk_for_coarsen(ds, factors, target_bytes=target_bytes)
+    for dim, factor in factors.items():
+        # Every chunk boundary falls on a window boundary
+        edges = np.cumsum(chunked.chunks[dim])[:-1]
+        assert (edges % factor == 0).all()
+    assert (len(chunked.chunks['day']) > 1) == split_time
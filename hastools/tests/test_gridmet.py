@@ -0,0 +1,176 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+import requests
+import xarray as xr
+
+from hastools import gridmet
+from hastools.tests.server import StandInServer
+
+# The current year's file is the one GridMET keeps rewriting
+YEAR = datetime.date.today().year
+NAME = f'pr_{YEAR}.nc'
+
+
+def netcdf_bytes(size, fill):
+    return b'CDF\x01' + bytes([fill]) * (size - 4)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with StandInServer() as server:
+        monkeypatch.setattr(gridmet, 'GRIDMET_URL', f'{server.url}/files')
+        yield server
+
+
+def download(directory, year=YEAR):
+    return gridmet.download_gridmet_variable('pr', year, str(directory))
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_fresh_download(server, tmp_path):
+    server.files[NAME] = (netcdf_bytes(100_000, 1), '"v1"')
+    path = download(tmp_path)
+    assert read(path) == server.files[NAME][0]
+    assert os.listdir(tmp_path) == [NAME]
+    method, headers = server.headers[0]
+    assert method == 'HEAD' and headers['Accept-Encoding'] == 'identity'
+
+
+def test_complete_file_is_not_downloaded_again(server, tmp_path):
+    server.files[NAME] = (netcdf_bytes(100_000, 1), '"v1"')
+    download(tmp_path)
+    server.headers.clear()
+    download(tmp_path)
+    assert [method for method, _ in server.headers] == ['HEAD']
+
+
+def test_rewritten_file_is_not_resumed(server, tmp_path):
+    # An old complete file becomes a prefix-sized copy of the new one
+    server.files[NAME] = (netcdf_bytes(100_000, 1), '"v1"')
+    download(tmp_path)
+    server.files[NAME] = (netcdf_bytes(150_000, 2), '"v2"')
+    server.headers.clear()
+    path = download(tmp_path)
+    assert read(path) == server.files[NAME][0]
+    assert 'Range' not in server.headers[1][1]
+
+
+def test_partial_download_resumes(server, tmp_path):
+    body = netcdf_bytes(100_000, 1)
+    server.files[NAME] = (body, '"v1"')
+    part = tmp_path / f'{NAME}.part'
+    part.write_bytes(body[:40_000])
+    (tmp_path / f'{NAME}.part.validator').write_text('"v1"')
+    path = download(tmp_path)
+    assert read(path) == body
+    headers = server.headers[1][1]
+    assert headers['Range'] == 'bytes=40000-'
+    assert headers['If-Range'] == '"v1"'
+    assert os.listdir(tmp_path) == [NAME]
+
+
+def test_partial_download_of_old_version_restarts(server, tmp_path):
+    server.files[NAME] = (netcdf_bytes(150_000, 2), '"v2"')
+    part = tmp_path / f'{NAME}.part'
+    part.write_bytes(netcdf_bytes(100_000, 1)[:40_000])
+    (tmp_path / f'{NAME}.part.validator').write_text('"v1"')
+    path = download(tmp_path)
+    assert read(path) == server.files[NAME][0]
+    assert 'Range' not in server.headers[1][1]
+
+
+def test_file_changed_between_head_and_get(server, tmp_path, monkeypatch):
+    # The validator matches the HEAD, but If-Range catches the change
+    body = netcdf_bytes(100_000, 1)
+    server.files[NAME] = (body, '"v1"')
+    part = tmp_path / f'{NAME}.part'
+    part.write_bytes(body[:40_000])
+    (tmp_path / f'{NAME}.part.validator').write_text('"v1"')
+    original = gridmet.remote_info
+
+    def remote_info_then_change(url, session=None):
+        info = original(url, session)
+        server.files[NAME] = (netcdf_bytes(150_000, 2), '"v2"')
+        return info
+
+    monkeypatch.setattr(gridmet, 'remote_info', remote_info_then_change)
+    path = download(tmp_path)
+    assert read(path) == server.files[NAME][0]
+
+
+def test_complete_past_year_is_not_checked(server, tmp_path):
+    server.files['pr_2000.nc'] = (netcdf_bytes(100_000, 1), '"v1"')
+    download(tmp_path, 2000)
+    server.headers.clear()
+    server.files['pr_2000.nc'] = (netcdf_bytes(150_000, 2), '"v2"')
+    path = download(tmp_path, 2000)
+    assert server.headers == []
+    assert read(path) == netcdf_bytes(100_000, 1)
+
+
+def test_existing_file_is_used_offline(server, tmp_path, monkeypatch):
+    server.files[NAME] = (netcdf_bytes(100_000, 1), '"v1"')
+    path = download(tmp_path)
+    # Nothing listens on port 9 (discard)
+    monkeypatch.setattr(gridmet, 'GRIDMET_URL', 'http://127.0.0.1:9/files')
+    assert download(tmp_path) == path
+    os.remove(path)
+    with pytest.raises(requests.ConnectionError):
+        download(tmp_path)
+
+
+def test_download_many_reports_progress(server, tmp_path):
+    for year in (2000, 2001):
+        server.files[f'pr_{year}.nc'] = (netcdf_bytes(1000, 1), '"v1"')
+    calls = []
+    paths = gridmet.download_gridmet(
+        ['pr'], [2000, 2001], str(tmp_path),
+        progress=lambda *args: calls.append(args))
+    assert [os.path.basename(path) for path in paths] == [
+        'pr_2000.nc', 'pr_2001.nc']
+    assert [n_done for n_done, _, _ in calls] == [1, 2]
+    assert sorted(path for _, _, path in calls) == paths
+
+
+def write_packed_netcdf(path, year):
+    # Like the GridMET files: uint16 values with a scale factor
+    days = np.arange(f'{year}-01-01', f'{year + 1}-01-01',
+                     dtype='datetime64[D]')
+    rng = np.random.default_rng(year)
+    values = rng.uniform(0, 10, (len(days), 6, 5)).round(1)
+    values[0, 0, 0] = np.nan
+    ds = xr.Dataset(
+        {'potential_evapotranspiration': (('day', 'lat', 'lon'), values),
+         'crs': ((), 0)},
+        coords={'day': days, 'lat': np.linspace(40, 39, 6),
+                'lon': np.linspace(-112, -111, 5)})
+    ds['potential_evapotranspiration'].encoding = {
+        'dtype': 'uint16', 'scale_factor': 0.1, 'add_offset': 0.0,
+        '_FillValue': 32767}
+    ds.to_netcdf(path)
+    return path
+
+
+def test_zarr_round_trip(tmp_path, recwarn):
+    files = [write_packed_netcdf(tmp_path / f'pet_{year}.nc', year)
+             for year in (2000, 2001)]
+    stores = gridmet.gridmet_to_zarr_layouts(files, str(tmp_path))
+    assert not [w for w in recwarn if 'zarr' in str(w.category).lower()]
+    expected = gridmet.open_gridmet(files).load()
+    for layout, store in stores.items():
+        ds = gridmet.open_gridmet_zarr(store)
+        xr.testing.assert_identical(ds.load(), expected)
+        encoding = ds['potential_evapotranspiration'].encoding
+        assert encoding['dtype'] == np.uint16
+        assert encoding['scale_factor'] == 0.1
+    ds = gridmet.open_gridmet_zarr(stores['timeseries'])
+    assert ds.chunks['day'] == (len(ds['day']),)
+    ds = gridmet.open_gridmet_zarr(stores['map'])
+    assert ds.chunks['day'][0] == 8
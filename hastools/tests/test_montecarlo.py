@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from hastools.montecarlo import (
+    StreamingMonteCarlo, convergence, monte_carlo, parallel_monte_carlo,
+    pi_kernel
+)
+
+
+def test_convergence_matches_independent_estimates():
+    curve = convergence(pi_kernel, [100, 1000, 5000], seed=3, batch_size=777)
+    for n in (100, 1000, 5000):
+        # The first n points of the same stream
+        expected = monte_carlo(pi_kernel, n, seed=3, batch_size=777)
+        np.testing.assert_allclose(curve.loc[n], expected.drop('n'))
+
+
+@pytest.mark.parametrize('n_jobs', [2, 3])
+def test_parallel_is_reproducible_for_any_n_jobs(n_jobs):
+    kwargs = dict(seed=7, chunk_size=10_000, batch_size=4096)
+    serial = parallel_monte_carlo(pi_kernel, 100_003, n_jobs=1, **kwargs)
+    parallel = parallel_monte_carlo(pi_kernel, 100_003, n_jobs=n_jobs, **kwargs)
+    assert serial.equals(parallel)
+    assert abs(serial['estimate'] - np.pi) < 4 * serial['stderr']
+
+
+def test_stratified_prefixes_cover_the_square():
+    sizes = [1000, 4096, 50_000, 2 ** 20]
+    curve = convergence(pi_kernel, sizes, seed=0, sampler='stratified')
+    assert (abs(curve['estimate'] - np.pi) < 0.15).all()
+
+
+@pytest.mark.parametrize('sampler', ['antithetic', 'sobol', 'stratified'])
+def test_stderr_matches_spread_over_seeds(sampler):
+    results = [monte_carlo(pi_kernel, 20_000, seed=seed, sampler=sampler)
+               for seed in range(200)]
+    estimates = np.array([result['estimate'] for result in results])
+    stderrs = np.array([result['stderr'] for result in results])
+    ratio = np.sqrt(np.mean(stderrs ** 2)) / estimates.std()
+    assert 0.75 < ratio < 1.33
+
+
+def test_streaming_stops_on_replicate_stderr():
+    mc = StreamingMonteCarlo(pi_kernel, seed=1, sampler='sobol')
+    result = mc.run(2 ** 24, target_stderr=1e-3, batch_size=2 ** 14)
+    assert result['n'] < 2 ** 24
+    assert result['stderr'] <= 1e-3
+    assert abs(result['estimate'] - np.pi) < 4e-3
+
+
+@pytest.mark.parametrize('estimate', [monte_carlo, parallel_monte_carlo])
+@pytest.mark.parametrize('n', [0, -5])
+def test_no_samples_is_an_error(estimate, n):
+    with pytest.raises(ValueError):
+        estimate(pi_kernel, n)
+
+
+@pytest.mark.parametrize('sample_sizes', [[], [0, 100]])
+def test_convergence_needs_positive_sizes(sample_sizes):
+    with pytest.raises(ValueError):
+        convergence(pi_kernel, sample_sizes)
+
+
+def counting_sampler():
+    # Points are just their position in the stream, so the reservoir
+    # contents can be traced back
+    seen = 0
+
+    def sampler(rng, n, dim):
+        nonlocal seen
+        points = np.arange(seen, seen + n, dtype=np.float64)
+        seen += n
+        return np.repeat(points[:, None], dim, axis=1)
+
+    return sampler
+
+
+def test_reservoir_is_a_uniform_sample():
+    n, k, repeats = 200, 20, 2000
+    counts = np.zeros(n)
+    for seed in range(repeats):
+        mc = StreamingMonteCarlo(
+            lambda p: 2 * p[:, 0], seed=seed, reservoir_size=k,
+            sampler=counting_sampler())
+        for size in (7, 30, 1, 62, 100):
+            mc.update(size)
+        assert mc.points.shape == (k, 2)
+        np.testing.assert_array_equal(mc.values, 2 * mc.points[:, 0])
+        positions = mc.points[:, 0].astype(int)
+        assert len(np.unique(positions)) == k
+        counts[positions] += 1
+    # Each point is kept with probability k / n
+    expected = repeats * k / n
+    assert np.abs(counts - expected).max() < 5 * np.sqrt(expected)
+    # Early and late points alike
+    assert abs(counts[:n // 2].mean() - counts[n // 2:].mean()) < 10
+
+
+def test_reservoir_keeps_everything_until_full():
+    mc = StreamingMonteCarlo(
+        pi_kernel, seed=0, reservoir_size=50, sampler=counting_sampler())
+    mc.update(20).update(10)
+    np.testing.assert_array_equal(mc.points[:, 0], np.arange(30))
@@ -0,0 +1,109 @@
+from urllib.parse import parse_qsl, urlsplit
+
+import pandas as pd
+import pytest
+
+from hastools import usgs
+from hastools.store import GaugeStore
+from hastools.tests.server import StandInServer
+
+T = pd.Timestamp
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with StandInServer() as server:
+        monkeypatch.setattr(usgs, 'NWIS_SERVICE_URL', f'{server.url}/nwis/dv/')
+        yield server
+
+
+def requested_ranges(server):
+    queries = [dict(parse_qsl(urlsplit(path).query))
+               for _, path in server.requests]
+    return [(q['startDT'], q['endDT']) for q in queries]
+
+
+def test_missing_ranges_empty_store():
+    assert usgs.missing_ranges([], '2000-01-01', '2000-12-31') == [
+        (T('2000-01-01'), T('2000-12-31'))]
+
+
+def test_missing_ranges_head_gap_and_tail():
+    covered = [(T('2005-01-01'), T('2010-12-31'))]
+    assert usgs.missing_ranges(covered, '2000-01-01', '2011-12-31', 30) == [
+        (T('2000-01-01'), T('2004-12-31')),
+        (T('2010-12-01'), T('2011-12-31')),
+    ]
+
+
+def test_missing_ranges_hole_between_covered_ranges():
+    covered = [(T('2000-01-01'), T('2001-12-31')),
+               (T('2003-01-01'), T('2005-12-31'))]
+    assert usgs.missing_ranges(covered, '2000-01-01', '2004-12-31', 30) == [
+        (T('2002-01-01'), T('2002-12-31'))]
+
+
+def test_coverage_merges_ranges(tmp_path):
+    store = GaugeStore(str(tmp_path))
+    store.add_coverage('1', '2000-01-01', '2000-12-31')
+    store.add_coverage('1', '2001-01-01', '2001-06-30')
+    store.add_coverage('1', '2003-01-01', '2003-12-31')
+    assert store.coverage('1') == [
+        (T('2000-01-01'), T('2001-06-30')),
+        (T('2003-01-01'), T('2003-12-31')),
+    ]
+
+
+def test_refresh_does_not_repeat_empty_head(server, tmp_path):
+    # The gauge record starts years after the requested begin date
+    server.record_start = T('2010-01-01')
+    store = GaugeStore(str(tmp_path))
+    n_rows = usgs.update_usgs_store(
+        ['09506000'], '2000-01-01', '2012-12-31', overlap_days=30,
+        store=store)
+    assert n_rows['09506000'] == len(pd.date_range('2010-01-01', '2012-12-31'))
+    server.requests.clear()
+    usgs.update_usgs_store(
+        ['09506000'], '2000-01-01', '2013-01-31', overlap_days=30,
+        store=store)
+    # Only the provisional tail and the new month are asked for
+    assert requested_ranges(server) == [('2012-12-01', '2013-01-31')]
+    df = usgs.read_store('09506000', store=store)
+    assert df.index.min() == T('2010-01-01')
+    assert df.index.max() == T('2013-01-31')
+    assert df.index.is_unique
+
+
+def test_incremental_reads_back_through_given_store(server, tmp_path,
+                                                    monkeypatch):
+    def no_default_store(*args):
+        raise AssertionError('the default store was used')
+
+    monkeypatch.setattr(usgs, 'get_store', no_default_store)
+    store = GaugeStore(str(tmp_path))
+    df = usgs.open_usgs_data(
+        '09506000', '2000-01-01', '2000-01-10', incremental=True,
+        store=store)
+    assert len(df) == 10
+    many = usgs.open_usgs_data_many(
+        ['09506000', '09498500'], '2000-01-01', '2000-01-10',
+        incremental=True, store=store)
+    assert many.shape == (20, 3)
+    assert list(many.index.levels[0]) == ['09498500', '09506000']
+
+
+def test_batch_without_data_is_skipped(server, tmp_path, monkeypatch):
+    # NWIS answers 404 for the first batch, which only has inactive sites
+    monkeypatch.setattr(usgs, 'MAX_SITES_PER_REQUEST', 2)
+    server.inactive = {'01', '02'}
+    sites = ['01', '02', '03']
+    df = usgs.open_usgs_data_many(
+        sites, '2000-01-01', '2000-01-10', cache=False)
+    assert list(df.index.unique('site')) == ['03']
+    assert len(df) == 10
+
+    store = GaugeStore(str(tmp_path))
+    n_rows = usgs.update_usgs_store(
+        sites, '2000-01-01', '2000-01-10', store=store)
+    assert n_rows == {'01': 0, '02': 0, '03': 10}
+    assert store.coverage('01') == [(T('2000-01-01'), T('2000-01-10'))]
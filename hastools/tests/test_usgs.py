@@ -0,0 +1,120 @@
+import io
+
+import pandas as pd
+import pytest
+
+from hastools import usgs
+from hastools.tests.server import StandInServer
+from hastools.usgs import (
+    iter_rdb_chunks, read_rdb, read_rdb_table, water_year
+)
+
+HEADER = (
+    '# US Geological Survey, "water data"\n'
+    'agency_cd\tsite_no\tdatetime\t1_00060_00003\t1_00060_00003_cd\n'
+    '5s\t15s\t20d\t14n\t10s\n'
+)
+ROWS = [
+    'USGS\t09506000\t2020-01-01\t12.5\tA',
+    'USGS\t09506000\t2020-01-02\tIce\tA',
+    'USGS\t09506000\t2020-01-03\tEqp\tP',
+    'USGS\t09506000\t2020-01-04\t7\tP',
+]
+
+
+def rdb(rows):
+    return HEADER + '\n'.join(rows) + '\n'
+
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+def test_types_follow_the_type_line(engine):
+    df = read_rdb_table(rdb(ROWS), engine=engine)
+    assert list(df.columns) == [
+        'agency_cd', 'site_no', 'datetime', '1_00060_00003',
+        '1_00060_00003_cd']
+    assert df['1_00060_00003'].dtype == 'float64'
+    assert pd.api.types.is_datetime64_dtype(df['datetime'])
+    assert isinstance(df['1_00060_00003_cd'].dtype, pd.CategoricalDtype)
+    # Site numbers keep their leading zeros
+    assert (df['site_no'] == '09506000').all()
+
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+def test_qualifier_codes_become_nan(engine):
+    df = read_rdb(rdb(ROWS), engine=engine)
+    assert df['streamflow'].tolist()[::3] == [12.5, 7.0]
+    assert df['streamflow'].isna().tolist() == [False, True, True, False]
+    assert df['quality_flag'].tolist() == ['A', 'A', 'P', 'P']
+    assert df.index[0] == pd.Timestamp('2020-01-01')
+
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+def test_unknown_codes_fall_back_to_coercion(engine):
+    rows = ROWS + ['USGS\t09506000\t2020-01-05\tXyz\tP']
+    df = read_rdb(rdb(rows), engine=engine)
+    assert df['streamflow'].dtype == 'float64'
+    assert df['streamflow'].isna().tolist() == [
+        False, True, True, False, True]
+    assert df['site'].iloc[-1] == '09506000'
+
+
+def test_engines_agree():
+    text = rdb(ROWS * 3)
+    c = read_rdb(text, engine='c')
+    arrow = read_rdb(text, engine='pyarrow')
+    pd.testing.assert_frame_equal(c.astype(str), arrow.astype(str))
+    pd.testing.assert_index_equal(c.index, arrow.index)
+
+
+def test_header_only():
+    df = read_rdb(HEADER)
+    assert df.empty
+    assert list(df.columns) == ['agency', 'site', 'streamflow', 'quality_flag']
+
+
+def daily_rdb(begin, end):
+    days = pd.date_range(begin, end)
+    return rdb([
+        f'USGS\t09506000\t{day.date()}\t'
+        f'{"Ice" if day.day == 15 else day.dayofyear}\tA'
+        for day in days
+    ])
+
+
+@pytest.mark.parametrize('chunksize', [50, 365, 10_000])
+def test_chunks_are_whole_water_years(chunksize):
+    # Starts and ends mid water year, and chunk edges fall anywhere
+    text = daily_rdb('2000-06-01', '2003-02-15')
+    chunks = list(iter_rdb_chunks(io.StringIO(text), chunksize=chunksize))
+    years = [water_year(chunk.index.to_series()).unique().tolist()
+             for chunk in chunks]
+    assert years == [[2000], [2001], [2002], [2003]]
+    assert chunks[1].index[0] == pd.Timestamp('2000-10-01')
+    assert chunks[1].index[-1] == pd.Timestamp('2001-09-30')
+    whole = read_rdb_table(text).set_index('datetime')
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks), whole, check_dtype=False,
+        check_categorical=False)
+
+
+def test_raw_chunks():
+    text = daily_rdb('2000-01-01', '2000-12-31')
+    chunks = list(iter_rdb_chunks(io.StringIO(text), chunksize=100, by=None))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 100, 66]
+
+
+def test_iv_chunks_give_the_same_monthly_means(monkeypatch):
+    with StandInServer() as server:
+        monkeypatch.setattr(usgs, 'NWIS_IV_URL', f'{server.url}/nwis/iv/')
+        args = ('09506000', '2000-08-01', '2002-11-30')
+        chunks = list(usgs.open_usgs_iv_chunks(*args, chunksize=500))
+        whole = read_rdb_table(
+            usgs.fetch_text(usgs.create_usgs_iv_url(*args)))
+    # Water years 2000 to 2003, each spanning several chunks
+    assert len(chunks) == 4
+    assert len(whole) > 6 * 500
+    monthly = pd.concat(
+        chunk.resample('ME').mean(numeric_only=True) for chunk in chunks)
+    expected = whole.set_index('datetime').resample('ME').mean(
+        numeric_only=True)
+    pd.testing.assert_frame_equal(monthly, expected)
@@ -0,0 +1,573 @@
+"""
+Helpers for downloading daily streamflow from the USGS
+National Water Information System (NWIS).
+
+All requests go through the pooled session in `hastools.download`,
+so pulling many gauges in a row reuses the same keep-alive
+connection instead of paying TCP/TLS setup for each site.
+"""
+import asyncio
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+from .cache import cache_key, is_provisional, resolve_cache
+from .download import (
+    TIMEOUT, fetch_all_async, fetch_text, get_session, run_sync
+)
+from .store import get_store
+
+NWIS_DV_URL = 'https://waterdata.usgs.gov/nwis/dv'
+NWIS_SERVICE_URL = 'https://waterservices.usgs.gov/nwis/dv/'
+NWIS_IV_URL = 'https://waterservices.usgs.gov/nwis/iv/'
+COLUMNS = ['agency', 'site', 'date', 'streamflow', 'quality_flag']
+
+# The NWIS web service caps the number of sites in one request
+MAX_SITES_PER_REQUEST = 100
+
+# Codes NWIS puts in place of a value when there is no measurement,
+# e.g. `Ice` for ice affected or `Eqp` for equipment malfunction
+QUALIFIER_CODES = [
+    'Ice', 'Eqp', 'Ssn', 'Bkw', 'Dis', 'Rat', 'Mnt', 'Fld', 'Dry',
+    'Zfl', 'Pr', 'Tst', 'Eff', '***', '--',
+]
+COMMENT_LINES = re.compile(r'^#.*\n?', re.MULTILINE)
+
+# How many days before the last stored value to re-request when
+# refreshing, so revised provisional values are picked up
+OVERLAP_DAYS = 30
+
+
+def create_usgs_url(site_no, begin_date, end_date):
+    return (
+        f'{NWIS_DV_URL}?'
+        f'cb_00060=on&format=rdb&referred_module=sw&'
+        f'site_no={site_no}&'
+        f'begin_date={begin_date}&'
+        f'end_date={end_date}'
+    )
+
+
+def create_usgs_many_url(sites, begin_date, end_date):
+    return (
+        f'{NWIS_SERVICE_URL}?'
+        f'format=rdb&parameterCd=00060&statCd=00003&'
+        f'sites={",".join(sites)}&'
+        f'startDT={begin_date}&'
+        f'endDT={end_date}'
+    )
+
+
+def usgs_cache_key(site, begin_date, end_date):
+    return cache_key(
+        'usgs_dv', site=site, parameter='00060',
+        begin_date=pd.Timestamp(begin_date).date(),
+        end_date=pd.Timestamp(end_date).date()
+    )
+
+
+def create_usgs_iv_url(site_no, begin_date, end_date, parameter='00060'):
+    return (
+        f'{NWIS_IV_URL}?'
+        f'format=rdb&parameterCd={parameter}&'
+        f'sites={site_no}&'
+        f'startDT={begin_date}&'
+        f'endDT={end_date}'
+    )
+
+
+def split_rdb(text):
+    """
+    Split a multi-site RDB response into one RDB chunk per site.
+    Each site gets its own header line (starting with `agency_cd`)
+    since the time series column names differ between sites.
+    """
+    text = COMMENT_LINES.sub('', text)
+    return [
+        chunk if chunk.startswith('agency_cd') else 'agency_cd' + chunk
+        for chunk in text.split('\nagency_cd') if chunk.strip()
+    ]
+
+
+def parse_rdb_header(text):
+    """
+    Read the column names and types of an RDB file without touching
+    the body. Returns (names, types, n_skip) where `types` are the
+    single letter codes from the type line (`s` string, `d` date,
+    `n` number) and `n_skip` is the number of lines before the first
+    row of data. Returns None if there is no header.
+    """
+    pos = 0
+    n_skip = 0
+    while text.startswith('#', pos):
+        pos = text.find('\n', pos) + 1
+        n_skip += 1
+        if pos == 0:
+            return None
+    header_end = text.find('\n', pos)
+    if header_end == -1:
+        return None
+    types_end = text.find('\n', header_end + 1)
+    if types_end == -1:
+        types_end = len(text)
+    names = text[pos:header_end].rstrip('\r').split('\t')
+    types = text[header_end + 1:types_end].rstrip('\r').split('\t')
+    types = [t.strip()[-1:] for t in types]
+    return names, types, n_skip + 2
+
+
+def _rdb_dtypes(names, types):
+    """
+    pandas dtype of each RDB column: float64 for numbers, categorical
+    for the `..._cd` code columns (agency, qualifier flags, time
+    zones), which repeat a handful of values, and str otherwise.
+    """
+    return {
+        name: (np.float64 if t == 'n'
+               else 'category' if name.endswith('_cd') else str)
+        for name, t in zip(names, types)
+    }
+
+
+def _read_rdb_pandas(text, names, types, n_skip, engine):
+    numeric = [n for n, t in zip(names, types) if t == 'n']
+    dtype = _rdb_dtypes(names, types)
+    read_args = dict(
+        sep='\t', header=None, names=names, usecols=range(len(names)),
+        skiprows=n_skip, na_values=QUALIFIER_CODES, engine=engine,
+    )
+    try:
+        return pd.read_csv(io.StringIO(text), dtype=dtype, **read_args)
+    except ValueError:
+        # An unexpected qualifier code in a numeric column. Fall back
+        # to reading those as strings and coercing them afterwards.
+        dtype.update({n: str for n in numeric})
+        df = pd.read_csv(io.StringIO(text), dtype=dtype, **read_args)
+        for name in numeric:
+            df[name] = pd.to_numeric(
+                df[name], errors='coerce').astype(np.float64)
+        return df
+
+
+def _read_rdb_pyarrow(text, names, types, n_skip):
+    import pyarrow as pa
+    import pyarrow.csv
+
+    column_types = {
+        'n': pa.float64(), 'd': pa.timestamp('us'),
+    }
+    codes = pa.dictionary(pa.int32(), pa.string())
+
+    def read(column_types):
+        table = pa.csv.read_csv(
+            io.BytesIO(text.encode()),
+            read_options=pa.csv.ReadOptions(
+                skip_rows=n_skip, column_names=names),
+            parse_options=pa.csv.ParseOptions(
+                delimiter='\t', quote_char=False),
+            convert_options=pa.csv.ConvertOptions(
+                column_types=column_types, include_columns=names,
+                null_values=['', *QUALIFIER_CODES],
+                strings_can_be_null=True),
+        )
+        return table.to_pandas()
+
+    typed = {
+        name: column_types.get(
+            t, codes if name.endswith('_cd') else pa.string())
+        for name, t in zip(names, types)
+    }
+    try:
+        return read(typed)
+    except pa.ArrowInvalid:
+        # An unexpected qualifier code in a numeric column, or dates
+        # arrow can't parse. Read those as strings and let pandas
+        # coerce them.
+        loose = [n for n, t in zip(names, types) if t in column_types]
+        df = read({**typed, **dict.fromkeys(loose, pa.string())})
+        for name, t in zip(names, types):
+            if t == 'n':
+                df[name] = pd.to_numeric(
+                    df[name], errors='coerce').astype(np.float64)
+            elif t == 'd':
+                df[name] = pd.to_datetime(df[name], format='ISO8601')
+        return df
+
+
+def read_rdb_table(text, engine=None, usecols=None):
+    """
+    Read any NWIS RDB table into a DataFrame in a single pass.
+
+    Column names come from the header line and dtypes from the type
+    line: `n` columns are read straight into float64 (qualifier codes
+    such as `Ice` or `Eqp`, and any other text, become NaN), `d`
+    columns are converted to datetimes, the `..._cd` code columns
+    become categoricals and everything else, including site numbers
+    with their leading zeros, is kept as strings.
+
+    With `engine=None` the table is parsed by `pyarrow.csv` if pyarrow
+    is installed (`engine='pyarrow'`), which is several times faster,
+    and by the pandas C parser (`engine='c'`) otherwise. If given,
+    only the first `usecols` columns are read.
+    """
+    header = parse_rdb_header(text)
+    if header is None:
+        return pd.DataFrame()
+    names, types, n_skip = header
+    if usecols is not None:
+        names, types = names[:usecols], types[:usecols]
+    if engine is None:
+        try:
+            import pyarrow  # noqa: F401
+            engine = 'pyarrow'
+        except ImportError:
+            engine = 'c'
+    if engine == 'pyarrow':
+        return _read_rdb_pyarrow(text, names, types, n_skip)
+    df = _read_rdb_pandas(text, names, types, n_skip, engine)
+    for name in (n for n, t in zip(names, types) if t == 'd'):
+        df[name] = pd.to_datetime(df[name], format='ISO8601')
+    return df
+
+
+def read_rdb(text, engine=None):
+    """
+    Parse an NWIS daily values RDB response for a single site into
+    a DataFrame indexed by date with the columns `agency`, `site`,
+    `streamflow`, and `quality_flag`. See `read_rdb_table`.
+    """
+    df = read_rdb_table(text, engine=engine, usecols=len(COLUMNS))
+    if df.empty and len(df.columns) < len(COLUMNS):
+        return pd.DataFrame(
+            columns=['agency', 'site', 'streamflow', 'quality_flag'],
+            index=pd.DatetimeIndex([], name='date')
+        )
+    df.columns = COLUMNS
+    return df.set_index('date')
+
+
+def water_year(dates):
+    """
+    The water year of each date, which runs from October 1st of the
+    previous year through September 30th.
+    """
+    return dates.dt.year + (dates.dt.month >= 10)
+
+
+def iter_rdb_chunks(stream, chunksize=100_000, by='water_year'):
+    """
+    Read an RDB table from a text `stream` with bounded memory.
+
+    The body is read `chunksize` rows at a time with the same typing
+    rules as `read_rdb_table`, and each chunk is indexed by its first
+    date column. With `by='water_year'` (the default) rows are
+    regrouped so that one complete water year is yielded at a time,
+    with `by=None` the raw chunks are yielded as they are read.
+    """
+    line = stream.readline()
+    while line.startswith('#'):
+        line = stream.readline()
+    if not line.strip():
+        return
+    names = line.rstrip('\r\n').split('\t')
+    types = [t.strip()[-1:] for t in stream.readline().split('\t')]
+    numeric = [n for n, t in zip(names, types) if t == 'n']
+    dates = [n for n, t in zip(names, types) if t == 'd']
+    # A chunk that fails the float cast can't be re-read from a
+    # stream, so numbers are always read as strings and coerced
+    reader = pd.read_csv(
+        stream, sep='\t', header=None, names=names, dtype=str,
+        na_values=QUALIFIER_CODES, chunksize=chunksize,
+    )
+    pending = None
+    for chunk in reader:
+        for name in numeric:
+            chunk[name] = pd.to_numeric(
+                chunk[name], errors='coerce').astype(np.float64)
+        for name in dates:
+            chunk[name] = pd.to_datetime(chunk[name], format='ISO8601')
+        if by is None:
+            yield chunk.set_index(dates[0])
+            continue
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        years = water_year(chunk[dates[0]])
+        # Records are sorted by time, so every year before the
+        # last one in the chunk is complete
+        last = years.iloc[-1]
+        for _, group in chunk[years < last].groupby(years[years < last]):
+            yield group.set_index(dates[0])
+        pending = chunk[years == last]
+    if pending is not None and len(pending):
+        yield pending.set_index(dates[0])
+
+
+class IterStream(io.RawIOBase):
+    """A read-only file object over an iterator of bytes."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def open_usgs_iv_chunks(site, begin_date, end_date, parameter='00060',
+                        chunksize=100_000, by='water_year', session=None):
+    """
+    Stream instantaneous values (e.g. 15 minute streamflow) for a
+    single USGS site, yielding one water year at a time so that
+    decades of data never have to fit in memory at once. Downstream
+    aggregation can then run per chunk, e.g. for monthly means:
+
+        monthly = pd.concat(
+            chunk.resample('ME').mean(numeric_only=True)
+            for chunk in open_usgs_iv_chunks(site, begin, end)
+        )
+
+    Water years start on a month boundary, so this gives the same
+    result as resampling the full record.
+    """
+    session = session or get_session()
+    url = create_usgs_iv_url(site, begin_date, end_date, parameter)
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        raw = IterStream(response.iter_content(chunk_size=2 ** 16))
+        stream = io.TextIOWrapper(io.BufferedReader(raw), encoding='utf-8')
+        yield from iter_rdb_chunks(stream, chunksize=chunksize, by=by)
+
+
+def open_usgs_data(site, begin_date, end_date, session=None, cache=None,
+                   incremental=False, store=None):
+    """
+    Download daily mean streamflow (cfs) for a single USGS site.
+    Results are stored in the on-disk cache (see `hastools.cache`),
+    pass `cache=False` to always download.
+
+    With `incremental=True` the site's history is kept in the local
+    gauge store instead (see `hastools.store`), and only the days
+    missing from it are downloaded. See `update_usgs_store`; `store`
+    is the `GaugeStore` to use, the default one if not given.
+
+    Returns a DataFrame indexed by date with the columns
+    `agency`, `site`, `streamflow`, and `quality_flag`.
+    """
+    if incremental:
+        update_usgs_store(
+            [site], begin_date, end_date, store=store, session=session)
+        return read_store(site, begin_date, end_date, store=store)
+    cache = resolve_cache(cache)
+    key = usgs_cache_key(site, begin_date, end_date)
+    df = cache.get(key) if cache is not None else None
+    if df is None:
+        url = create_usgs_url(site, begin_date, end_date)
+        df = read_rdb(fetch_text(url, session=session))
+        if cache is not None:
+            cache.put(key, df, provisional=is_provisional(end_date))
+    return df
+
+
+async def open_usgs_data_async(site, begin_date, end_date, cache=None,
+                               **kwargs):
+    """`async` version of `open_usgs_data`."""
+    cache = resolve_cache(cache)
+    key = usgs_cache_key(site, begin_date, end_date)
+    df = cache.get(key) if cache is not None else None
+    if df is None:
+        url = create_usgs_url(site, begin_date, end_date)
+        texts = await fetch_all_async([url], **kwargs)
+        df = read_rdb(texts[0])
+        if cache is not None:
+            cache.put(key, df, provisional=is_provisional(end_date))
+    return df
+
+
+async def _open_sites_async(sites, begin_date, end_date, cache, kwargs):
+    """
+    Return a dict of site -> frame, taking what we can from the cache
+    and downloading the rest in batches of `MAX_SITES_PER_REQUEST`.
+    Sites without any data are left out. NWIS answers 404 when none
+    of the sites in a batch has data in the range, which is treated
+    the same way.
+    """
+    cache = resolve_cache(cache)
+    frames = {}
+    if cache is not None:
+        for site in sites:
+            df = cache.get(usgs_cache_key(site, begin_date, end_date))
+            if df is not None:
+                frames[site] = df
+    missing = [site for site in sites if site not in frames]
+    urls = [
+        create_usgs_many_url(
+            missing[i:i + MAX_SITES_PER_REQUEST], begin_date, end_date)
+        for i in range(0, len(missing), MAX_SITES_PER_REQUEST)
+    ]
+    texts = await fetch_all_async(urls, missing_ok=True, **kwargs)
+    provisional = is_provisional(end_date)
+    for text in texts:
+        if text is None:
+            continue
+        for chunk in split_rdb(text):
+            df = read_rdb(chunk)
+            if df.empty:
+                continue
+            site = df['site'].iloc[0]
+            frames[site] = df
+            if cache is not None:
+                key = usgs_cache_key(site, begin_date, end_date)
+                cache.put(key, df, provisional=provisional)
+    return frames
+
+
+async def open_usgs_data_many_async(sites, begin_date, end_date, cache=None,
+                                    **kwargs):
+    """
+    Download daily mean streamflow (cfs) for many USGS sites, using
+    as few requests as possible. Sites already in the on-disk cache
+    are not requested again. The rest are sent to NWIS in batches
+    of up to `MAX_SITES_PER_REQUEST`, the batches are downloaded
+    concurrently, and the combined responses are split back up per
+    site. Extra keyword arguments go to `fetch_all_async`.
+
+    Returns a long format DataFrame indexed by (`site`, `date`) with
+    the columns `agency`, `streamflow`, and `quality_flag`.
+    """
+    # Keep the order the sites were given in, but drop duplicates
+    sites = list(dict.fromkeys(str(s) for s in sites))
+    frames = await _open_sites_async(
+        sites, begin_date, end_date, cache, kwargs)
+    if not frames:
+        return pd.DataFrame(
+            columns=['agency', 'streamflow', 'quality_flag'],
+            index=pd.MultiIndex.from_arrays([[], []], names=['site', 'date'])
+        )
+    df = pd.concat(frames.values())
+    return df.set_index('site', append=True).swaplevel().sort_index()
+
+
+def open_usgs_data_many(sites, begin_date, end_date, incremental=False,
+                        **kwargs):
+    """
+    Blocking version of `open_usgs_data_many_async`. With
+    `incremental=True` the sites are refreshed in, and read from,
+    the local gauge store (or the `GaugeStore` passed as `store=`)
+    as in `open_usgs_data`.
+    """
+    if not incremental:
+        return run_sync(
+            open_usgs_data_many_async(sites, begin_date, end_date, **kwargs))
+    sites = list(dict.fromkeys(str(s) for s in sites))
+    kwargs.pop('cache', None)
+    store = kwargs.pop('store', None)
+    update_usgs_store(sites, begin_date, end_date, store=store, **kwargs)
+    df = pd.concat([
+        read_store(site, begin_date, end_date, store=store)
+        for site in sites
+    ])
+    return df.set_index('site', append=True).swaplevel().sort_index()
+
+
+def missing_ranges(covered, begin_date, end_date, overlap_days=OVERLAP_DAYS):
+    """
+    Work out which (begin, end) date ranges need downloading, given
+    the sorted (begin, end) ranges already `covered` (see
+    `GaugeStore.coverage`). That is every part of the request outside
+    the covered ranges, where the last covered range is treated as
+    ending `overlap_days` early so its provisional tail is refreshed.
+    """
+    begin = pd.Timestamp(begin_date)
+    end = pd.Timestamp(end_date)
+    one_day = pd.Timedelta(days=1)
+    covered = list(covered)
+    if covered:
+        first, last = covered.pop()
+        last = last - pd.Timedelta(days=overlap_days) - one_day
+        if last >= first:
+            covered.append((first, last))
+    ranges = []
+    start = begin
+    for first, last in covered:
+        if last < start:
+            continue
+        if first > end:
+            break
+        if first > start:
+            ranges.append((start, first - one_day))
+        start = last + one_day
+    if start <= end:
+        ranges.append((start, end))
+    return ranges
+
+
+async def update_usgs_store_async(sites, begin_date, end_date=None,
+                                  overlap_days=OVERLAP_DAYS, store=None,
+                                  **kwargs):
+    """
+    Bring the local gauge store up to date for `sites` between
+    `begin_date` and `end_date` (default today). Only the parts of
+    the record that are missing locally are downloaded, plus an
+    `overlap_days` window at the end so that revised provisional
+    values replace the stored ones. Sites that need the same date
+    range are batched into one request.
+
+    Returns a dict of site -> number of rows downloaded.
+    """
+    store = store or get_store()
+    if end_date is None:
+        end_date = pd.Timestamp.today().normalize()
+    sites = list(dict.fromkeys(str(s) for s in sites))
+    groups = {}
+    for site in sites:
+        for start, end in missing_ranges(
+                store.coverage(site), begin_date, end_date, overlap_days):
+            groups.setdefault((start, end), []).append(site)
+    results = await asyncio.gather(*(
+        _open_sites_async(
+            group, start.date(), end.date(), cache=False, kwargs=kwargs)
+        for (start, end), group in groups.items()
+    ))
+    n_rows = dict.fromkeys(sites, 0)
+    for ((start, end), group), frames in zip(groups.items(), results):
+        for site, df in frames.items():
+            store.write(site, df)
+            n_rows[site] = n_rows.get(site, 0) + len(df)
+        # Record the request even for sites that had no data in it
+        for site in group:
+            store.add_coverage(site, start, end)
+    return n_rows
+
+
+def update_usgs_store(sites, begin_date, end_date=None, **kwargs):
+    """Blocking version of `update_usgs_store_async`."""
+    return run_sync(
+        update_usgs_store_async(sites, begin_date, end_date, **kwargs))
+
+
+def read_store(site, begin_date=None, end_date=None, store=None):
+    """
+    Read a site's history from the local gauge store, in the same
+    format as `open_usgs_data`.
+    """
+    store = store or get_store()
+    df = store.read(str(site), begin_date, end_date)
+    if df is None:
+        return pd.DataFrame(
+            columns=['agency', 'site', 'streamflow', 'quality_flag'],
+            index=pd.DatetimeIndex([], name='date')
+        )
+    return df
@@ -125,3 +125,69 @@ plt.xlabel('Sample size')
 plt.ylabel('Pi estimate')
 
 # %%
+
+# %%
+# ******************************************
+# The same convergence sweep, vectorized.
+# `hastools.montecarlo` draws all the points in
+# batches, computes the hits for a whole batch
+# at once, and reads every sample size off one
+# cumulative sum instead of redrawing each time.
+# It also gives the standard error and a 95%
+# confidence interval for each estimate.
+# ******************************************
+from hastools.montecarlo import convergence, estimate_pi, pi_kernel
+
+curve = convergence(pi_kernel, all_samples_sizes, seed=42)
+plt.plot(curve.index, curve['estimate'], marker='o')
+plt.fill_between(curve.index, curve['ci_low'], curve['ci_high'], alpha=0.3)
+plt.axhline(np.pi, color='black')
+plt.xlabel('Sample size')
+plt.ylabel('Pi estimate')
+
+# %%
+estimate_pi(10_000_000, seed=42)
+
+# %%
+# For really big sample sizes spread the work over
+# every core. The answer is exactly the same no
+# matter how many processes (`n_jobs`) are used.
+from hastools.montecarlo import parallel_monte_carlo
+
+if __name__ == '__main__':
+    print(parallel_monte_carlo(pi_kernel, 1_000_000_000, seed=42))
+
+# %%
+# Keeping `all_x`, `all_y` and `all_r` for every point
+# doesn't work for billions of points. The streaming
+# version only keeps running totals, stops once the
+# estimate is precise enough, and keeps a random 2000
+# points to make the same scatter plot as above.
+from hastools.montecarlo import StreamingMonteCarlo
+
+mc = StreamingMonteCarlo(pi_kernel, seed=42, reservoir_size=2000)
+print(mc.run(10_000_000_000, target_stderr=1e-4))
+
+in_circle = mc.values > 0
+points = 2 * mc.points - 1
+plt.scatter(points[in_circle, 0], points[in_circle, 1])
+plt.scatter(points[~in_circle, 0], points[~in_circle, 1])
+
+# %%
+# Random points aren't the only option. Quasi-random
+# sequences (Sobol, Halton) and stratified designs spread
+# the points out more evenly and converge much faster.
+# Compare the error of each sampler against the time taken.
+# Antithetic pairs (u, 1 - u) are left out: the circle is
+# symmetric, so both points of a pair land on the same side
+# and it does worse than plain random points.
+from hastools.montecarlo import benchmark_samplers
+
+samplers = ['uniform', 'sobol', 'halton', 'stratified', 'latin_hypercube']
+benchmark = benchmark_samplers(
+    pi_kernel, np.pi, [2**10, 2**13, 2**16, 2**19], samplers=samplers)
+for name, group in benchmark.groupby(level='sampler'):
+    plt.loglog(group['seconds'], group['rmse'], marker='o', label=name)
+plt.xlabel('Seconds per estimate')
+plt.ylabel('RMS error')
+plt.legend()
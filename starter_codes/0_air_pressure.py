@@ -3,20 +3,16 @@
 # calculating the air pressure at a given elevation
 # that we worked through in class.
 
-import math
-
 # %% 
-
-def air_pressure_at_height(h):
-    p0 = 101325      # reference pressure in pascals
-    M = 0.02896968   # molar mass of air kg/mol
-    g = 9.81         # gravity m/s2
-    R0 = 8.314462618 # gas constant J/(mol·K) 
-    T = 273          # temp in kelvin
-
-    ratio = -(g * h * M) / (R0 * T)
-    p_h = p0 * math.exp(ratio)
-    return p_h
+# The function lives in `hastools.atmosphere` so every script
+# uses the same version. It computes
+#
+#   p_h = p0 * exp(-(g * h * M) / (R0 * T))
+#
+# with p0 = 101325 Pa (reference pressure), M = 0.02896968 kg/mol
+# (molar mass of air), g = 9.81 m/s2 (gravity),
+# R0 = 8.314462618 J/(mol·K) (gas constant) and T = 273 K by default.
+from hastools.atmosphere import air_pressure_at_height
 # %%
 
 # List of elevations to run
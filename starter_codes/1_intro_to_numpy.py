@@ -17,23 +17,14 @@
 # to save you time on typing
 # I'm also importing math so that we can compare
 # and finally the function from the previous script
+# NOTE: for a single number the function uses math.exp,
+#       and for whole arrays np.exp. You will see why
+#       in a minute
 
 import time
 import math
 import numpy as np
-
-def air_pressure_at_height(h):
-    p0 = 101325      # reference pressure in pascals
-    M = 0.02896968   # molar mass of air kg/mol
-    g = 9.81         # gravity m/s2
-    R0 = 8.314462618 # gas constant J/(mol·K) 
-    T = 273          # temp in kelvin
-
-    ratio = -(g * h * M) / (R0 * T)
-    # NOTE: here I changed math.exp -> np.exp, 
-    #       you will see why in a minute
-    p_h = p0 * np.exp(ratio)
-    return p_h
+from hastools.atmosphere import air_pressure_at_height
 
 # Heights to calculate pressure at
 start = 0
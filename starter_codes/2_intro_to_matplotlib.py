@@ -30,17 +30,7 @@ import time
 import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
-
-def air_pressure_at_height(h, T0=273):
-    p0 = 101325      # reference pressure in pascals
-    M = 0.02896968   # molar mass of air kg/mol
-    g = 9.81         # gravity m/s^2
-    R0 = 8.314462618 # gas constant J/(mol·K) 
-    T = T0           # temp in kelvin
-
-    ratio = -(g * h * M) / (R0 * T)
-    p_h = p0 * np.exp(ratio)
-    return p_h
+from hastools.atmosphere import air_pressure_at_height
 
 # %%
 # Okay, our first plot will be the variation
@@ -87,8 +77,8 @@ plt.ylabel('Air pressure [pa]')
 # %%
 # Beautiful! But, we're not done yet. If you've looked
 # closely at the function for the air pressure you might
-# have noticed we added a new argument `T0` with a default
-# argument of 273.15. By a default argument we mean that 
+# have noticed we added a new argument `T` with a default
+# argument of 273. By a default argument we mean that 
 # if you don't supply an alternative, it sets that one as
 # the value. But we know air pressure is a function of 
 # temperature and so we might want to see how that affects
@@ -98,9 +88,9 @@ plt.ylabel('Air pressure [pa]')
 # and then call the `plt.plot` function on each of the 
 # results.
 p_273 = air_pressure_at_height(heights)
-p_293 = air_pressure_at_height(heights, T0=293)
-p_313 = air_pressure_at_height(heights, T0=313)
-p_333 = air_pressure_at_height(heights, T0=333)
+p_293 = air_pressure_at_height(heights, T=293)
+p_313 = air_pressure_at_height(heights, T=313)
+p_333 = air_pressure_at_height(heights, T=333)
 
 plt.plot(heights, p_273)
 plt.plot(heights, p_293)
@@ -119,9 +109,9 @@ plt.ylabel('Air pressure [pa]')
 # `plt.legend()` after we are done plotting the lines to
 # add it to the figure
 p_273 = air_pressure_at_height(heights)
-p_293 = air_pressure_at_height(heights, T0=293)
-p_313 = air_pressure_at_height(heights, T0=313)
-p_333 = air_pressure_at_height(heights, T0=333)
+p_293 = air_pressure_at_height(heights, T=293)
+p_313 = air_pressure_at_height(heights, T=313)
+p_333 = air_pressure_at_height(heights, T=333)
 
 plt.plot(heights, p_273, label='T=273K')
 plt.plot(heights, p_293, label='T=293K')
@@ -139,7 +129,7 @@ plt.legend()
 # how
 temps = [273, 293, 313, 333]
 for T in temps:
-    p_temp = air_pressure_at_height(heights, T0=T)
+    p_temp = air_pressure_at_height(heights, T=T)
     plt.plot(heights, p_temp, label='T='+str(T)+'K')
 
 plt.xlabel('Height above sea level [m]')
@@ -165,12 +155,15 @@ plt.legend()
 temps = np.arange(200, 400, 1)
 pressures = []
 for T in temps:
-    p_new = air_pressure_at_height(heights, T0=T)
+    p_new = air_pressure_at_height(heights, T=T)
     pressures.append(p_new)
 
 # Stack just sticks a list of numpy arrays 
 # together along a new dimension
 pressures = np.stack(pressures)
+# NOTE: the function broadcasts heights against temperatures,
+#       so the loop and stack can be done in one call with
+#       `air_pressure_at_height(heights, temps[:, np.newaxis])`
 ax = plt.imshow(pressures)
 plt.colorbar(
     fraction=0.02,  # Just shrinking the size of it
@@ -109,6 +109,10 @@ plt.legend()
 # but really it's the same thing), and 75th percentile.
 # And now we can plot thos for Dana meadows to show the 
 # variability through the snow season
+# NOTE: each groupby below re-groups and re-sorts the whole frame.
+# `hastools.climatology.Climatology(df, 'dayofyear')` sorts once and
+# gives all of these (plus min/max/count) from that one pass, e.g.
+# `clim['median']`, `clim[0.25]`, `clim[0.75]`.
 doy_med = df.groupby(df.index.dayofyear).median()
 doy_low = df.groupby(df.index.dayofyear).quantile(0.25)
 doy_high = df.groupby(df.index.dayofyear).quantile(0.75)
@@ -95,34 +95,11 @@ plt.xlabel('')
 # just turn our little data processing things into some helper
 # functions to save space, and make this easier for you to port
 # to your homework
-def create_usgs_url(site_no, begin_date, end_date):
-    return (
-        f'https://waterdata.usgs.gov/nwis/dv?'
-        f'cb_00060=on&format=rdb&referred_module=sw&'
-        f'site_no={site_no}&'
-        f'begin_date={begin_date}&'
-        f'end_date={end_date}'
-    )
-
-def open_usgs_data(site, begin_date, end_date):
-    url = create_usgs_url((site), begin_date, end_date)
-    response = urllib.request.urlopen(url)
-    df = pd.read_table(
-        response,
-        comment='#',
-        skipfooter=1,
-        delim_whitespace=True,
-        names=['agency', 'site', 'date', 'streamflow', 'quality_flag'],
-        index_col=2,
-        parse_dates=True
-    ).iloc[2:]
-
-    # Now convert the streamflow data to floats and
-    # the index to datetimes. When processing raw data
-    # it's common to have to do some extra postprocessing
-    df['streamflow'] = df['streamflow'].astype(np.float64)
-    df.index = pd.DatetimeIndex(df.index)
-    return df
+# These helpers now live in the `hastools.usgs` module at the
+# top of this repository, so every script can share one copy.
+# It keeps a single HTTP connection open between downloads,
+# which makes pulling data for lots of gauges much faster.
+from hastools.usgs import create_usgs_url, open_usgs_data
 
 
 # %%
@@ -1,5 +1,4 @@
 #%%
-import urllib
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -8,35 +7,9 @@ import matplotlib.pyplot as plt
 from sklearn.linear_model import LinearRegression
 
 # %%
-def create_usgs_url(site_no, begin_date, end_date):
-    return (f'https://waterdata.usgs.gov/nwis/dv?'
-        f'cb_00060=on&format=rdb&referred_module=sw&'
-        f'site_no={site_no}&'
-        f'begin_date={begin_date}&'
-        f'end_date={end_date}')
-
-def open_usgs_data(site, begin_date, end_date):
-    url = create_usgs_url((site), begin_date, end_date)
-    response = urllib.request.urlopen(url)
-    df = pd.read_table(
-        response, comment='#', skipfooter=1, delim_whitespace=True,
-        names=['agency', 'site', 'date', 'streamflow', 'quality_flag'],
-        index_col=2, parse_dates=True).iloc[2:]
-    df['streamflow'] = df['streamflow'].astype(np.float64)
-    df.index = pd.DatetimeIndex(df.index)
-    return df
-
-def open_daymet_data(lat, lon, begin_date, end_date):
-    args = {'lat':  lat, 'lon': lon, 'format': 'csv',
-            'start': begin_date, 'end': end_date}
-    query = urllib.parse.urlencode(args)
-    url = f"https://daymet.ornl.gov/single-pixel/api/data?{query}"
-    response = urllib.request.urlopen(url)
-    df = pd.read_csv(response, header=6)
-    datestring = (df['year'].astype(str) + df['yday'].astype(str))
-    dates = pd.to_datetime(datestring, format='%Y%j')
-    df.index = pd.DatetimeIndex(dates)
-    return df
+from hastools.usgs import create_usgs_url, open_usgs_data
+from hastools.daymet import open_daymet_data
+from hastools.align import align_daymet_usgs
 
 
 #%%
@@ -49,9 +22,7 @@ lon = -111.7898705
 daymet_df = open_daymet_data(lat, lon, begin_date, end_date)
 daymet_df.head()
 verde_df = open_usgs_data(site, begin_date, end_date)
-daymet_df = daymet_df.reindex(verde_df.index)
-daymet_df['streamflow'] = verde_df['streamflow']
-df = daymet_df
+df = align_daymet_usgs(daymet_df, verde_df)
 df.head()
 
 
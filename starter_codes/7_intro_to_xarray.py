@@ -91,19 +91,11 @@ ds['air'].attrs
 # Dataset objects can contain multiple variables. The dataset
 # from the tutorial here only has a single one, the air temperature
 # but we can easily add a new variable, "pressure", using our
-# trusty function from the beginning of the course:
-def air_pressure_at_height_and_temp(h, T0):
-    p0 = 101325      # reference pressure in pascals
-    M = 0.02896968   # molar mass of air kg/mol
-    g = 9.81         # gravity m/s^2
-    R0 = 8.314462618 # gas constant J/(mol·K) 
-    T = T0           # temp in kelvin
-
-    ratio = -(g * h * M) / (R0 * T)
-    p_h = p0 * np.exp(ratio)
-    return p_h
-
-ds['pressure'] = air_pressure_at_height_and_temp(2.0, ds['air'])
+# trusty function from the beginning of the course, which
+# also takes the temperature (in kelvin) as its second argument:
+from hastools.atmosphere import air_pressure_at_height
+
+ds['pressure'] = air_pressure_at_height(2.0, ds['air'])
 
 # Adding some metadata, this part is optional, but good practice!!
 ds['pressure'].attrs['units'] = 'Pa'